@@ -0,0 +1,157 @@
+import sys, json, zipfile, argparse
+import Engine
+
+# Command line interface. Imports nothing from Qt, so it works on machines without a display.
+# Every line written to stdout is a JSON object with an "event" key.
+
+commands = ["compress", "extract", "list", "test", "estimate"]
+progressInterval = 0.5
+
+exitOk = 0
+exitMemberErrors = 1
+exitUsage = 2
+exitFailed = 3
+exitCancelled = 130
+
+
+def emit(event: str, **fields) -> None:
+    fields["event"] = event
+    sys.stdout.write(json.dumps(fields)+"\n")
+    sys.stdout.flush()
+
+
+def reportProgress(job: Engine.Job, event: str = "progress", **fields) -> None:
+    progress = job.getProgress()
+    if(event == "progress"):
+        fields.update(speed=round(progress.speed), eta=round(progress.eta, 1))
+    else:
+        fields.update(speed=round(progress.averageSpeed))
+    emit(event, done=progress.done, total=progress.total, bytes=progress.bytes, total_bytes=progress.totalBytes, seconds=round(progress.seconds, 3), **fields)
+
+
+def follow(job: Engine.Job, errorEvent: str = "error") -> int:
+    # Waits on this thread, so Ctrl+C reaches it and can cancel the job cleanly
+    while True:
+        try:
+            if(job.join(progressInterval)):
+                break
+        except KeyboardInterrupt:
+            job.cancel()
+            continue
+        reportProgress(job)
+    try:
+        errors = job.result()
+    except Engine.OperationCancelled:
+        emit("cancelled")
+        return exitCancelled
+    for name, e in errors:
+        emit(errorEvent, member=name, message=str(e))
+    reportProgress(job, "done", failed=len(errors), **job.stats)
+    return exitMemberErrors if len(errors) > 0 else exitOk
+
+
+def compress(args) -> int:
+    budget = Engine.CompressionBudget(args.time_budget, args.min_speed*1000000) if args.time_budget > 0 or args.min_speed > 0 else None
+    return follow(Engine.compress(args.zip, args.paths, args.algorithm, args.level, args.threads, args.block_threshold*1000000, update=args.update, verifyCrc=args.verify_crc, cache=Engine.BlobCache(args.cache, args.cache_size*1000000) if args.cache else None, budget=budget))
+
+
+def extract(args) -> int:
+    names = args.members if args.members else None
+    return follow(Engine.extract(args.zip, args.destination, names, None, args.threads))
+
+
+def listArchive(args) -> int:
+    size = compressedSize = 0
+    try:
+        directory = Engine.CentralDirectory(args.zip)
+    except (OSError, zipfile.BadZipFile, ValueError):
+        directory = None
+    if(directory != None):
+        with directory:
+            for i in range(len(directory)):
+                emit("member", name=directory.getName(i), size=directory.sizes[i], compressed_size=directory.compressedSizes[i], crc=directory.crcs[i], method=directory.methods[i])
+            size, compressedSize, count = sum(directory.sizes), sum(directory.compressedSizes), len(directory)
+    else:
+        with zipfile.ZipFile(args.zip) as zipObj:
+            for info in zipObj.infolist():
+                emit("member", name=info.filename, size=info.file_size, compressed_size=info.compress_size, crc=info.CRC, method=info.compress_type)
+                size += info.file_size
+                compressedSize += info.compress_size
+            count = len(zipObj.infolist())
+    emit("done", members=count, size=size, compressed_size=compressedSize)
+    return exitOk
+
+
+def test(args) -> int:
+    return follow(Engine.test(args.zip, None, None, args.threads), "corrupt")
+
+
+def estimate(args) -> int:
+    result = Engine.estimateCompression(Engine.collectMembers(args.paths), args.algorithm, args.level, args.threads, args.block_threshold*1000000)
+    emit("done", members=result.members, size=result.inputBytes, compressed_size=result.size, ratio=round(result.ratio, 4), seconds=round(result.seconds, 3), sampled_bytes=result.sampledBytes)
+    return exitOk
+
+
+def getParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="zipmanager", description="SomePythonThings Zip Manager command line interface. Progress and results are printed as one JSON object per line.")
+    parser.add_argument("--verbose", action="store_true", help="write the log to stderr")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_compress = subparsers.add_parser("compress", help="create a zip file")
+    parser_compress.add_argument("zip")
+    parser_compress.add_argument("paths", nargs="+", help="files and folders to add")
+    parser_compress.add_argument("--algorithm", default="Deflated", choices=list(Engine.compressionTypes.keys()))
+    parser_compress.add_argument("--level", type=int, default=5, choices=range(1, 10))
+    parser_compress.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser_compress.add_argument("--block-threshold", type=int, default=64, help="files bigger than this (in MB) are deflated in parallel blocks")
+    parser_compress.add_argument("--update", action="store_true", help="copy the files that did not change from the existing zip instead of compressing them again")
+    parser_compress.add_argument("--verify-crc", action="store_true", help="with --update, also compare the CRC of the files")
+    parser_compress.add_argument("--cache", metavar="DIRECTORY", help="reuse the compressed data of files added to earlier zips from this directory")
+    parser_compress.add_argument("--cache-size", type=int, default=4096, help="size limit of the --cache directory, in MB")
+    budget = parser_compress.add_mutually_exclusive_group()
+    budget.add_argument("--time-budget", type=float, default=0, metavar="SECONDS", help="lower the level as needed to finish in this time (--level is the highest level used)")
+    budget.add_argument("--min-speed", type=float, default=0, metavar="MB/S", help="lower the level as needed to compress at least this fast (--level is the highest level used)")
+    parser_compress.set_defaults(function=compress)
+
+    parser_extract = subparsers.add_parser("extract", help="extract a zip file")
+    parser_extract.add_argument("zip")
+    parser_extract.add_argument("-m", "--member", dest="members", action="append", help="only extract this member (can be given more than once)")
+    parser_extract.add_argument("-d", "--destination", default=".")
+    parser_extract.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser_extract.set_defaults(function=extract)
+
+    parser_list = subparsers.add_parser("list", help="list the contents of a zip file")
+    parser_list.add_argument("zip")
+    parser_list.set_defaults(function=listArchive)
+
+    parser_test = subparsers.add_parser("test", help="check the integrity of a zip file")
+    parser_test.add_argument("zip")
+    parser_test.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser_test.set_defaults(function=test)
+
+    parser_estimate = subparsers.add_parser("estimate", help="predict the size of a zip file and the time it would take to compress, from a few samples")
+    parser_estimate.add_argument("paths", nargs="+", help="files and folders to add")
+    parser_estimate.add_argument("--algorithm", default="Deflated", choices=list(Engine.compressionTypes.keys()))
+    parser_estimate.add_argument("--level", type=int, default=5, choices=range(1, 10))
+    parser_estimate.add_argument("--threads", type=int, default=0, help="0 uses every core")
+    parser_estimate.add_argument("--block-threshold", type=int, default=64, help="files bigger than this (in MB) are deflated in parallel blocks")
+    parser_estimate.set_defaults(function=estimate)
+    return parser
+
+
+def main(argv: list) -> int:
+    args = getParser().parse_args(argv)
+    if(args.verbose):
+        Engine.setLogger(lambda s: print(s, file=sys.stderr))
+    try:
+        return args.function(args)
+    except KeyError as e:
+        emit("failed", message=str(e.args[0]))
+        return exitFailed
+    except (OSError, zipfile.BadZipFile) as e:
+        emit("failed", message=str(e))
+        return exitFailed
+
+
+if(__name__ == "__main__"):
+    sys.exit(main(sys.argv[1:]))
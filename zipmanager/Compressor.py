@@ -1,18 +1,17 @@
 
 from PySide2 import QtWidgets, QtGui, QtCore
-from CustomWidgets import TreeWidget, ProgressUpdater, KillableThread, ComboBoxAction, SpinBoxAction
+from CustomWidgets import TreeWidget, JobWatcher, ProgressUpdater, ComboBoxAction, SpinBoxAction, CheckBoxAction
 
 from Tools import *
 #from Tools import log, debugging, _platform, getFileIcon, getPath, openOnExplorer, notify, settings
-import os, zipfile, time, sys
+import os
 from threading import Thread
 from sys import platform as _platform
-import subprocess
-from qt_thread_updater import get_updater
+import Engine
 
 class Compressor(QtWidgets.QWidget):
-
-    setIconSignal = QtCore.Signal(QtWidgets.QTreeWidgetItem, QtGui.QIcon)
+    changeItemsStatusSignal = QtCore.Signal(list, str, str)
+    estimateFinishedSignal = QtCore.Signal(int, object)
 
     def __init__(self, parent=None):
         super().__init__(parent=parent)
@@ -21,8 +20,21 @@ class Compressor(QtWidgets.QWidget):
         self.errorWhileCompressing = None
         self.compression_level = 5
         self.files = [] 
+        self.cancelToken = Engine.CancellationToken()
+        self.scanToken = Engine.CancellationToken()
+        self.scanThreads = []
+        self.statusIcons = {}
+        self.estimateToken = Engine.CancellationToken()
+        self.estimateGeneration = 0
+        self.estimateMembers = {} # Leaf items of the tree and their (path, name on the zip), so estimates do not walk the tree
+        self.estimateTimer = QtCore.QTimer(self)
+        self.estimateTimer.setSingleShot(True)
+        self.estimateTimer.setInterval(700) # Files are added in batches, so the estimate waits until they stop coming
+        self.estimateTimer.timeout.connect(self.startEstimate)
         self.setUpToolBar()
         self.setUpWidgets()
+        self.changeItemsStatusSignal.connect(self.changeItemsStatus)
+        self.estimateFinishedSignal.connect(self.showEstimate)
     
     def throwInfo(self, title: str, body: str) -> None:
         try:
@@ -75,11 +87,10 @@ class Compressor(QtWidgets.QWidget):
 
         self.toolBar.addSeparator()
 
-        self.setIconSignal.connect(lambda item, icon: item.setIcon(0, icon))
-
 
-        self.algorithm = ComboBoxAction(self, "Compression Algorithm: ", ["Deflated", "None", "BZIP2", "LZMA"])
+        self.algorithm = ComboBoxAction(self, "Compression Algorithm: ", ["Deflated", "None", "BZIP2", "LZMA", Engine.parallelDeflateAlgorithm]+Engine.autoAlgorithms)
         self.toolBar.addWidget(self.algorithm)
+        self.algorithm.combo.currentIndexChanged.connect(self.refreshEstimate)
 
         if(settings["default_algorithm"] == "Deflated"):
             self.algorithm.setIndex(0)
@@ -94,6 +105,23 @@ class Compressor(QtWidgets.QWidget):
 
         self.rate = SpinBoxAction(self, "Compression rate:", 1, 9, settings["default_level"])
         self.toolBar.addWidget(self.rate)
+        self.rate.combo.valueChanged.connect(self.refreshEstimate)
+
+        self.estimateLabel = QtWidgets.QLabel(self)
+        self.estimateLabel.setToolTip("Predicted size of the zip file and compression time, measured by compressing a few samples of the selected files")
+        self.toolBar.addWidget(self.estimateLabel)
+
+        self.toolBar.addSeparator()
+
+        self.timeLimit = SpinBoxAction(self, "Time limit (minutes):", 0, 1440, 0)
+        self.timeLimit.setToolTip("When set, the compression rate is lowered as needed to finish in this time, and the selected compression rate is the highest one used. 0 means no limit")
+        self.toolBar.addWidget(self.timeLimit)
+
+        self.toolBar.addSeparator()
+
+        self.updateCheck = CheckBoxAction(self, "Only recompress changed files: ", False)
+        self.updateCheck.setToolTip("When saving over an existing zip file, files that did not change since it was created are copied from it instead of being compressed again")
+        self.toolBar.addWidget(self.updateCheck)
 
         self.toolBar.addSeparator()
 
@@ -172,6 +200,7 @@ class Compressor(QtWidgets.QWidget):
     def startLoading(self) -> None:
         self.magicButton.setText("Cancel compression")
         self.isCompressing = True
+        self.estimateToken.cancel() # Sampling would compete with the compression for the CPU
         self.treeWidget.expandAll()
         self.fileExplorerTreeWidget.setEnabled(False)
         self.currentStatusBar.startLoading()
@@ -181,6 +210,8 @@ class Compressor(QtWidgets.QWidget):
         self.removeFilesAction.setEnabled(False)
         self.algorithm.setEnabled(False)
         self.rate.setEnabled(False)
+        self.timeLimit.setEnabled(False)
+        self.updateCheck.setEnabled(False)
         self.magicAction.setText("Cancel Compression")
         self.magicAction.setToolTip("Cancel Compression")
         self.magicAction.setIcon(QtGui.QIcon(getPath("cancelCompress.ico")))
@@ -189,6 +220,7 @@ class Compressor(QtWidgets.QWidget):
     def stopLoading(self) -> None:
         self.magicButton.setText("Compress")
         self.isCompressing = False
+        self.cancelToken.cancel()
         self.fileExplorerTreeWidget.setEnabled(True)
         self.treeWidget.setEnabled(True)
         self.addFileAction.setEnabled(True)
@@ -197,10 +229,13 @@ class Compressor(QtWidgets.QWidget):
         self.removeFilesAction.setEnabled(True)
         self.algorithm.setEnabled(True)
         self.rate.setEnabled(True)
+        self.timeLimit.setEnabled(True)
+        self.updateCheck.setEnabled(True)
         self.magicAction.setText("Compress")
         self.magicAction.setToolTip("Compress")
         self.magicAction.setIcon(QtGui.QIcon(getPath("compressFiles.ico")))
         self.currentStatusBar.stopLoading()
+        self.refreshEstimate()
     
     def openItemFile(self) -> None:
         item = self.treeWidget.currentItem()
@@ -256,19 +291,29 @@ class Compressor(QtWidgets.QWidget):
             log("[   OK   ] File opened succesfully (exit code is 0)")
 
     def removeFiles(self) -> None:
+        self.scanToken.cancel()
+        self.scanToken = Engine.CancellationToken()
         self.files = []
+        self.estimateMembers = {}
         while(self.treeWidget.topLevelItemCount()>0):
             self.treeWidget.takeTopLevelItem(0)
+        self.refreshEstimate()
         log('[   OK   ] File list cleared')
 
     def removeSelectedFiles(self) -> None:
         selectedFiles = self.treeWidget.selectedItems()
         for item in selectedFiles:
+            removed = [item]
+            while(len(removed) > 0):
+                child = removed.pop()
+                self.estimateMembers.pop(child, None)
+                removed += [child.child(i) for i in range(child.childCount())]
             if(item.parent()):
                 i = item.parent().takeChild(item.parent().indexOfChild(item))
             else:
                 i = self.treeWidget.takeTopLevelItem(self.treeWidget.indexOfTopLevelItem(item))
             del i
+        self.refreshEstimate()
         log('[   OK   ] Selected files removed from file list')
 
     def openFile(self, openFiles="None"):
@@ -320,11 +365,10 @@ class Compressor(QtWidgets.QWidget):
                             item.setText(2, "Pending")
                             item.setText(3, filename)
                             item.setText(4, "/")
-                            try:
-                                item.setIcon(0, QtGui.QIcon(getFileIcon(filename)))
-                            except:
-                                pass
+                            getIconService().setIcons([(item, filename)])
                             self.treeWidget.addTopLevelItem(item)
+                            self.estimateMembers[item] = (filename, os.path.join(item.text(4), filename.split('/')[-1]))
+                            self.refreshEstimate()
                     except Exception as e:
                         log('[ FAILED ] Unable to process file "'+filepath+'"')
                         if(debugging):
@@ -343,49 +387,6 @@ class Compressor(QtWidgets.QWidget):
     def getChildFolderName(self, baseDir: str, longerDir: str) -> str:
         return longerDir.replace(baseDir, "")
     
-    def setIcon(self, item: QtWidgets.QTreeWidgetItem, filename: str) -> None:
-        icon = QtGui.QIcon(getFileIcon(filename))
-        try:
-            log("[   OK   ] Icon loaded successfully")
-            self.setIconSignal.emit(item, icon)
-        except:
-            pass
-
-    def addChildFolder(self, folderItem: QtWidgets.QTreeWidgetItem, folderpath: str, rootFolder: str):
-        log(f"[   OK   ] Processing {folderpath} child files...")
-        len_root = len(folderpath.replace("\\", "/").split("/"))
-        for root, folders, files in os.walk(folderpath):
-            root = root.replace("\\", "/")
-            for file in files:
-                file = file.replace("\\", "/")
-                filename = root.replace("\\", "/")+"/"+file
-                if(len(root.split('/'))==len_root):
-                    log("[   OK   ] Adding child file "+root+"__"+file)
-                    item = QtWidgets.QTreeWidgetItem()
-                    item.setText(0, filename.split('/')[-1])
-                    item.setText(1, "{0:.3f} MB".format(os.path.getsize(filename)/1000000))
-                    item.setText(2, "Pending")
-                    item.setText(3, filename)
-                    item.setText(4, self.getChildFolderName(rootFolder, folderpath))
-                    Thread(target=self.setIcon, args=(item, filename)).start()
-                    folderItem.addChild(item)
-            for folder in folders:
-                folder = folder.replace("\\", "/")
-                foldername = root.replace("\\", "/")+"/"+folder.replace("\\", "/")
-                if(len(root.split('/'))==len_root):
-                    log("[   OK   ] Adding child folder "+root+folder)
-                    item = QtWidgets.QTreeWidgetItem()
-                    item.setText(0, foldername.split('/')[-1])
-                    item.setText(1, "{0:.3f} MB".format(os.path.getsize(foldername)/1000000))
-                    item.setText(2, "")
-                    item.setText(3, "/".join(foldername.split('/')[0:-1]))
-                    try:
-                        item.setIcon(0, QtGui.QIcon(QtGui.QPixmap(getPath("folder.ico")).scaledToWidth(24, QtCore.Qt.SmoothTransformation)))
-                    except:
-                        pass
-                    folderItem.addChild(item)
-                    self.addChildFolder(item, foldername, rootFolder)
-
     def openFolder(self, folder=""):
         log('[        ] Dialog in process')
         if(folder=="" or folder==False):
@@ -393,194 +394,190 @@ class Compressor(QtWidgets.QWidget):
             if folder == "":
                 log("[  WARN  ] User aborted dialog")
                 self.stopLoading()
+                return
         else:
             log("[  WARN  ] Folder was given as argument")
         log('[   OK   ] Dialog Completed')
         try:
+            folder = folder.replace("\\", "/")
+            rootFolder = "/".join(folder.split('/')[:-1])
             self.files.append([folder, folder, 'folder'])
+            folderIcon = getIconService().getFolderIcon()
             folderItem = QtWidgets.QTreeWidgetItem()
             folderItem.setText(0, folder.split('/')[-1])
-            folderItem.setText(1, "{0:.3f} MB".format(self.get_size(folder)))
+            folderItem.setText(1, "Calculating...")
             folderItem.setText(2, "")
-            folderItem.setText(3, "/".join(folder.split('/')[0:-1]))
-            try:
-                folderItem.setIcon(0, QtGui.QIcon(QtGui.QPixmap(getPath("folder.ico")).scaledToWidth(24, QtCore.Qt.SmoothTransformation)))
-            except:
-                pass
+            folderItem.setText(3, rootFolder)
+            folderItem.setIcon(0, folderIcon)
             self.treeWidget.addTopLevelItem(folderItem)
-            print(folder, '/'.join(folder.split('/')[:-1]))
-            self.addChildFolder(folderItem, folder, '/'.join(folder.split('/')[:-1]))
+            folderItems = {folder: folderItem}
+
+            def addEntries(entries: list) -> None:
+                children = {}
+                fileItems = []
+                members = {}
+                for path, parent, isFolder, size in entries:
+                    item = QtWidgets.QTreeWidgetItem()
+                    item.setText(0, path.split('/')[-1])
+                    if(isFolder):
+                        item.setText(1, "Calculating...")
+                        item.setText(2, "")
+                        item.setText(3, parent)
+                        item.setIcon(0, folderIcon)
+                        folderItems[path] = item
+                    else:
+                        item.setText(1, "{0:.3f} MB".format(size/1000000))
+                        item.setText(2, "Pending")
+                        item.setText(3, path)
+                        item.setText(4, self.getChildFolderName(rootFolder, parent))
+                        fileItems.append((item, path))
+                        members[item] = (path, os.path.join(item.text(4), path.split('/')[-1]))
+                    children.setdefault(parent, []).append(item)
+                for parent, items in children.items():
+                    folderItems[parent].addChildren(items)
+                    if(folderItems[parent].treeWidget() == None): # The folder was removed while it was being scanned
+                        for item in items:
+                            members.pop(item, None)
+                self.estimateMembers.update(members)
+                getIconService().setIcons(fileItems)
+                self.refreshEstimate()
+
+            def setFolderSizes(sizes: dict) -> None:
+                for path, size in sizes.items():
+                    folderItems[path].setText(1, "{0:.3f} MB".format(size/1000000))
+
+            def onFinished() -> None:
+                self.scanThreads.remove(thread)
+                if(len(self.scanThreads) == 0):
+                    self.treeWidget.setSortingEnabled(True)
+
+            # Sorting is suspended while scanning, otherwise every batch would re-sort the whole tree
+            self.treeWidget.setSortingEnabled(False)
+            thread = self.ScanFolderThread(folder, self.scanToken)
+            thread.addEntries.connect(addEntries)
+            thread.setFolderSizes.connect(setFolderSizes)
+            thread.throwError.connect(self.throwError)
+            thread.finished.connect(onFinished)
+            self.scanThreads.append(thread)
+            thread.start()
             log('[   OK   ] Folder selected successfully.')
         except Exception as e:
             if debugging:
                 raise e
             self.throwError("Error processing folder!", "Unable to read folder \""+folder+"\"")
 
-    def get_size(self, start_path):
-        total_size = 0
-        for dirpath, _, filenames in os.walk(start_path):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                if not os.path.islink(fp):
-                    total_size += int(os.path.getsize(fp)/1000000)
-        return total_size
-
-    def updateProgressBar(self, actual: int, total: int, actualFile=""):
-        if(actualFile!=""):
-            try:
-                size = os.path.getsize(actualFile)
-                size = size/1000
-                if(size<1000):
-                    fsize = f"{size:.2f} KB"
-                else:
-                    fsize = f"{size/1000:.2f} MB"
+    class ScanFolderThread(QtCore.QThread):
 
-            except FileNotFoundError:
-                fsize = "0 B"
-            self.currentStatusBar.infoLabel.setText(f"Compressing file \"{actualFile}\" ({fsize}, {actual} out of {total})")
-        else:
-            self.currentStatusBar.infoLabel.setText("Compressing...")
-        self.currentStatusBar.setRange(0, total)
-        self.currentStatusBar.setValue(actual)
-
-    class CreateZipThread(QtCore.QThread):
-        
-        throwInfo = QtCore.Signal(str, str)
-        throwWarning = QtCore.Signal(str, str)
+        addEntries = QtCore.Signal(list)
+        setFolderSizes = QtCore.Signal(dict)
         throwError = QtCore.Signal(str, str)
-        
-        updateProgressBar = QtCore.Signal([int, int], [int, int, str])
-        
-        changeItemIcon = QtCore.Signal(QtWidgets.QTreeWidgetItem, int, str)
-        changeItemText = QtCore.Signal(QtWidgets.QTreeWidgetItem, int, str)
 
-        def __init__(self, zipfilename: str, files: list, parent):
+        def __init__(self, folder: str, token: Engine.CancellationToken):
             super().__init__()
-            self.parent: Compressor = parent
-            self.zipfilename = zipfilename
-            self.files = files
-    
-        def pureCompress(self, zipObj: zipfile.ZipFile, a, b, compression_algorithm):
-            self.errorWhileCompressing = None
-            try:
-                zipObj.write(a, b, compression_algorithm, self.parent.compression_level)
-            except Exception as e:
-                self.errorWhileCompressing = e 
+            self.folder = folder
+            self.token = token
 
         def run(self):
-            log("[        ] Starting compression thread...")
+            log(f"[        ] Scanning folder {self.folder}...")
             try:
-                zipObj = zipfile.ZipFile(self.zipfilename, 'w')
-                totalFiles = 0
-                for item in self.files:
-                    self.changeItemIcon.emit(item, 2, getPath("not.ico"))
-                    self.changeItemText.emit(item, 2, "Queued")
-                    totalFiles += 1
-
-                log('[  INFO  ] Total number of files: '+str(totalFiles))
-                actualFile = 0
-                try:
-                    algorithm = self.parent.algorithm.getSelectedItem()
-                    if(algorithm == "None"):
-                        log("[   OK   ] Selected compression algorithm is none: {0}".format(algorithm))
-                        compression_type = zipfile.ZIP_STORED
-                    elif(algorithm == "LZMA"):
-                        log("[   OK   ] Selected compression algorithm is lzma: {0}".format(algorithm))
-                        compression_type = zipfile.ZIP_LZMA
-                    elif(algorithm == "BZIP2"):
-                        log("[   OK   ] Selected compression algorithm is bzip2: {0}".format(algorithm))
-                        compression_type = zipfile.ZIP_BZIP2
-                    else:
-                        log("[   OK   ] Selected compression algorithm is deflated: {0}".format(algorithm))
-                        compression_type = zipfile.ZIP_DEFLATED
-     
-                    self.updateProgressBar[int, int].emit(0, totalFiles)
-                except Exception as e:
-                    if(debugging):
-                        raise e
-                    self.throwWarning.emit("SomePythonThongs Zip Manager", "An error occurred while selecting your desired compression algorithm. Compression algorithm will be \"Deflated\". ")
-                    compression_type = zipfile.ZIP_DEFLATED
-
-                try:
-                    self.parent.compression_level = self.parent.rate.getSelectedItem()
-                except Exception as e:
-                    if(debugging):
-                        raise e
-                log(f"[   OK   ] Compress rate set to {self.parent.compression_level}")
-
-                errors = ""
-                allDone = True
-                for item in self.files:
-                    item: QtWidgets.QTreeWidgetItem
-                    self.changeItemIcon.emit(item, 2, getPath("loading.ico"))
-                    self.changeItemText.emit(item, 2, "Compressing")
-                    subdir = item.text(4)
-                    path = (item.text(3), '/'.join(item.text(3).split('/')[:-1]), subdir)
-                    try:
-                        self.updateProgressBar[int, int, str].emit(actualFile, totalFiles, path[0])
-                        os.chdir(path[1])
-                        if not self.zipfilename == path[0]:
-                            t = KillableThread(target=self.pureCompress, args=(zipObj, path[0].split('/')[-1], os.path.join(subdir, path[0].split('/')[-1]), compression_type), daemon=True)
-                            t.start()
-                            while t.is_alive():
-                                if not(self.parent.isCompressing):
-                                    log("[  WARN  ] User cancelled the zip creation!")
-                                    t.shouldBeRuning=False
-                                    for item in self.files:
-                                        self.changeItemIcon.emit(item, 2, getPath("warn.ico"))
-                                        self.changeItemText.emit(item, 2, "Canceled")
-                                    self.throwWarning.emit("SomePythonThings Zip Manager", "User cancelled the zip creation")
-                                    time.sleep(0.5)
-                                    zipObj.close()
-                                    try: 
-                                        os.remove(self.zipfilename)
-                                    except: 
-                                        log("[  WARN  ] Unable to remove zip file")
-                                    self.parent.files = []
-                                    break
-                                else:
-                                    time.sleep(0.01)
-                            t.join()
-                            if(self.errorWhileCompressing != None):
-                                raise self.errorWhileCompressing
-                            log('[   OK   ] File "'+str(path[0].split('/')[-1])+f'" added successfully on relative directory {subdir}')
-                        else:
-                            log('[  WARN  ] File "'+str(path[0].split('/')[-1])+'" skipped because it is the output zip')
-                        self.changeItemIcon.emit(item, 2, getPath("ok.ico"))
-                        self.changeItemText.emit(item, 2, "Done")
-                    except Exception as e:
-                        allDone = False
-                        self.changeItemIcon.emit(item, 2, getPath("warn.ico"))
-                        self.changeItemText.emit(item, 2, str(e))
-                        log(f'[ FAILED ] Unable to add file "{str(path)}": {e}')
-                        errors += " - "+str(path[0])+"\n"
-                    finally:
-                        actualFile += 1
-                    if not(self.parent.isCompressing):
-                        break
-                zipObj.close()
-                if(self.parent.isCompressing):
-                    get_updater().call_in_main(self.parent.stopLoading)
-                    notify("Compression Done!", "SomePythonThings Zip Manager has finished compressing the selected files and folders.", self.parent.window)
-                    if allDone:
-                        self.throwInfo.emit("SomepythonThings Zip Manager", 'The Zip file was created sucessfully!')
-                        log('[   OK   ] zip file created sucessfully')
-                    else:
-                        self.throwWarning.emit("SomePythonThings Zip Manager", 'The Zip file was created with some errors: \n'+str(errors))
-                        log('[  WARN  ] zip file created with errors:\n'+str(errors))
-                    get_updater().call_in_main(openOnExplorer, self.zipfilename, force=False)
+                sizes = Engine.scanFolder(self.folder, self.addEntries.emit, self.token)
+                self.setFolderSizes.emit(sizes)
+            except Engine.OperationCancelled:
+                log(f"[  WARN  ] Scan of folder {self.folder} was cancelled")
             except Exception as e:
-                get_updater().call_in_main(self.parent.stopLoading)
-                if(debugging):
-                    raise e
-                log('[ FAILED ] Error occurred while creating zip File')
-                try:
-                    self.throwError.emit("SomePythonThings Zip Manager", "Unable to create zip file "+self.zipfilename+".\n\nError reason:\n"+str(e))
-                except:
-                    self.throwError.emit("SomePythonThings Zip Manager", "Unable to create zip file.\n\nError reason:\n"+str(e))
+                log(f"[ FAILED ] Unable to scan folder {self.folder}: {e}")
+                self.throwError.emit("Error processing folder!", "Unable to read folder \""+self.folder+"\"")
+
+    def refreshEstimate(self, *args) -> None:
+        self.estimateTimer.start()
+
+    def startEstimate(self) -> None:
+        if(self.isCompressing):
+            return
+        self.estimateToken.cancel()
+        self.estimateToken = Engine.CancellationToken()
+        self.estimateGeneration += 1
+        members = list(self.estimateMembers.values())
+        if(len(members) == 0):
+            self.estimateLabel.setText("")
+            return
+        self.estimateLabel.setText("Estimating...")
+
+        def estimate(generation: int, algorithm: str, level: int, token: Engine.CancellationToken) -> None:
+            try:
+                result = Engine.estimateCompression(members, algorithm, level, settings["compression_threads"], settings["parallel_deflate_threshold"]*1000000, token)
+            except Engine.OperationCancelled:
+                return
+            except Exception as e:
+                log(f"[  WARN  ] Unable to estimate the compression: {e}")
+                result = None
+            self.estimateFinishedSignal.emit(generation, result)
+
+        Thread(target=estimate, args=(self.estimateGeneration, self.algorithm.getSelectedItem(), self.rate.getSelectedItem(), self.estimateToken), daemon=True).start()
+
+    def showEstimate(self, generation: int, result: Engine.CompressionEstimate) -> None:
+        if(generation != self.estimateGeneration):
+            return
+        if(result == None or result.inputBytes == 0):
+            self.estimateLabel.setText("")
+            return
+        self.estimateLabel.setText("Estimated size: {0:.1f} MB ({1:.0%}), about {2}".format(result.size/1000000, result.ratio, self.currentStatusBar.formatTime(max(result.seconds, 1))))
+        log(f"[  INFO  ] Estimated {result.size} bytes in {result.seconds:.2f}s for {result.members} files ({result.sampledBytes} bytes sampled)", level=logLevelDebug)
+
+    def changeItemsStatus(self, items: list, icon: str, text: str) -> None:
+        if not(icon in self.statusIcons):
+            self.statusIcons[icon] = QtGui.QIcon(QtGui.QPixmap(icon).scaledToHeight(16, QtCore.Qt.SmoothTransformation))
+        for item in items:
+            item.setIcon(2, self.statusIcons[icon])
+            item.setText(2, text)
+            item.setToolTip(2, text)
+        if(text=="Compressing" and len(items) > 0):
+            self.treeWidget.scrollToItem(items[-1])
+
+    def compressionFinished(self, job: Engine.Job, zipfilename: str, files: list) -> None:
+        try:
+            try:
+                errors = job.result()
+            except Engine.OperationCancelled:
+                log("[  WARN  ] User cancelled the zip creation!")
+                self.changeItemsStatus(files, getPath("warn.ico"), "Canceled")
+                self.throwWarning("SomePythonThings Zip Manager", "User cancelled the zip creation")
+                self.files = []
+                return
+            if(self.isCompressing):
+                self.stopLoading()
+                notify("Compression Done!", "SomePythonThings Zip Manager has finished compressing the selected files and folders.", self.window)
+                if(job.stats["reused_members"] > 0):
+                    log(f'[  INFO  ] {job.stats["reused_members"]} unchanged files ({job.stats["reused_bytes"]/1000000:.2f} MB) were copied from the previous zip file')
+                if(len(errors) == 0):
+                    if(job.stats["reused_members"] > 0):
+                        message = f'The Zip file was updated sucessfully!\n\n{job.stats["reused_members"]} files had not changed and were copied from the previous zip file.'
+                    else:
+                        message = 'The Zip file was created sucessfully!'
+                    if(job.stats["auto_stored_members"] > 0):
+                        message += f'\n\n{job.stats["auto_stored_members"]} files were already compressed ({job.stats["auto_stored_bytes"]/1000000:.2f} MB) and were stored as they are, saving about {job.stats["auto_saved_seconds"]:.1f} seconds.'
+                    if(job.stats["level_changes"] > 0):
+                        levels = sorted(((int(name.split("_")[1]), size) for name, size in job.stats.items() if name.startswith("level_") and name.endswith("_bytes")), reverse=True)
+                        message += '\n\nThe compression rate was adjusted to the time limit: '+", ".join(f"{size/1000000:.2f} MB with rate {level}" for level, size in levels)+'.'
+                    if(job.stats["budget_missed"] > 0):
+                        message += '\n\nThe compression took longer than the time limit: the files could not be compressed that fast, even with a lower compression rate.'
+                    self.throwInfo("SomepythonThings Zip Manager", message)
+                    log('[   OK   ] zip file created sucessfully')
+                else:
+                    details = "".join(f" - {source}\n" for source, e in errors)
+                    self.throwWarning("SomePythonThings Zip Manager", 'The Zip file was created with some errors: \n'+details)
+                    log('[  WARN  ] zip file created with errors:\n'+details)
+                openOnExplorer(zipfilename, force=False)
+        except Exception as e:
+            self.stopLoading()
+            if(debugging):
+                raise e
+            log('[ FAILED ] Error occurred while creating zip File')
+            self.throwError("SomePythonThings Zip Manager", "Unable to create zip file "+zipfilename+".\n\nError reason:\n"+str(e))
     
     def cancelZipCreation(self):
         self.isCompressing = False
+        self.cancelToken.cancel()
         log("[  WARN  ] Sending cancel signal to compression thread")
 
     def createZip(self):
@@ -593,15 +590,6 @@ class Compressor(QtWidgets.QWidget):
                 files.append(item)
             return files
 
-        def changeItemIcon(item: QtWidgets.QTreeWidgetItem, index: int, icon: str):
-            item.setIcon(index, QtGui.QIcon(QtGui.QPixmap(icon).scaledToHeight(16, QtCore.Qt.SmoothTransformation)))
-            
-        def changeItemText(item: QtWidgets.QTreeWidgetItem, index: int, text: str):
-            item.setText(index, text)
-            if(text=="Compressing"):
-                self.treeWidget.scrollToItem(item)
-            item.setToolTip(index, text)
-
         try:
             files = []
             for i in range(self.treeWidget.topLevelItemCount()):
@@ -620,24 +608,65 @@ class Compressor(QtWidgets.QWidget):
                 log("[  WARN  ] User aborted dialog")
                 self.stopLoading()
                 return 
-            file = open(zipfilename, 'w')
+            update = self.updateCheck.isChecked()
+            file = open(zipfilename, 'a' if update else 'w') # The existing zip is only replaced once the update is complete
             log('[   OK   ] zip file created succesfully')
             zipfilename = str(file.name)
             file.close()
             log('[        ] Creating zip file on '+str(zipfilename))
         
-            log("[        ] Initializing thread...")
-            self.t = self.CreateZipThread(zipfilename, files, self)
-            self.t.throwInfo.connect(self.throwInfo)
-            self.t.throwWarning.connect(self.throwWarning)
-            self.t.throwError.connect(self.throwError)
-            self.t.changeItemIcon.connect(changeItemIcon)
-            self.t.changeItemText.connect(changeItemText)
-            self.t.updateProgressBar[int, int].connect(self.updateProgressBar)
-            self.t.updateProgressBar[int, int, str].connect(self.updateProgressBar)
-            log("[   OK   ] Thread initialized!")
-
-            self.t.start()
+            totalFiles = len(files)
+            self.changeItemsStatus(files, getPath("not.ico"), "Queued")
+            log('[  INFO  ] Total number of files: '+str(totalFiles))
+            algorithm = "Deflated"
+            try:
+                algorithm = self.algorithm.getSelectedItem()
+                log("[   OK   ] Selected compression algorithm is {0}".format(algorithm))
+            except Exception as e:
+                if(debugging):
+                    raise e
+                self.throwWarning("SomePythonThongs Zip Manager", "An error occurred while selecting your desired compression algorithm. Compression algorithm will be \"Deflated\". ")
+            try:
+                self.compression_level = self.rate.getSelectedItem()
+            except Exception as e:
+                if(debugging):
+                    raise e
+            log(f"[   OK   ] Compress rate set to {self.compression_level}")
+            budget = None
+            if(self.timeLimit.getSelectedItem() > 0):
+                budget = Engine.CompressionBudget(self.timeLimit.getSelectedItem()*60)
+                log(f"[   OK   ] Time limit set to {self.timeLimit.getSelectedItem()} minutes")
+
+            members = []
+            items = []
+            for item in files:
+                item: QtWidgets.QTreeWidgetItem
+                subdir = item.text(4)
+                filename = item.text(3)
+                if not zipfilename == filename:
+                    members.append((filename, os.path.join(subdir, filename.split('/')[-1])))
+                    items.append(item)
+                else:
+                    log('[  WARN  ] File "'+str(filename.split('/')[-1])+'" skipped because it is the output zip')
+                    self.changeItemsStatus([item], getPath("ok.ico"), "Done")
+
+            def onMembersStarted(indexes: list) -> None:
+                self.changeItemsStatusSignal.emit([items[index] for index in indexes], getPath("loading.ico"), "Compressing")
+
+            def onMembersDone(indexes: list) -> None:
+                for index in indexes:
+                    log('[   OK   ] File "'+str(members[index][0].split('/')[-1])+f'" added successfully as {members[index][1]}', level=logLevelDebug)
+                self.changeItemsStatusSignal.emit([items[index] for index in indexes], getPath("ok.ico"), "Done")
+
+            def onMemberFailed(index: int, e: Exception) -> None:
+                self.changeItemsStatusSignal.emit([items[index]], getPath("warn.ico"), str(e))
+                log(f'[ FAILED ] Unable to add file "{members[index][0]}": {e}')
+
+            self.cancelToken = Engine.CancellationToken()
+            job = Engine.compress(zipfilename, members, algorithm, self.compression_level, settings["compression_threads"], settings["parallel_deflate_threshold"]*1000000, onMembersStarted, onMembersDone, onMemberFailed, self.cancelToken, update, cache=blobCache, budget=budget)
+            watcher = JobWatcher(job, self)
+            watcher.progressChanged.connect(lambda progress: self.currentStatusBar.setProgress(progress, "Compressing"))
+            watcher.finished.connect(lambda job: self.compressionFinished(job, zipfilename, files))
         
         except Exception as e:
             self.throwError("SomePythonThings Zip Manager", "An error occurred while creating the compressed file.\n\nError details:\n"+str(e))
@@ -4,8 +4,7 @@ from PySide2 import QtCore, QtGui, QtWidgets
 from Tools import *
 #from Tools import getPath, log, debugging
 from sys import platform as _platform
-from threading import Thread
-import sys, typing
+import typing, Engine
 
 
 class TreeWidget(QTreeWidget):
@@ -87,6 +86,216 @@ class TreeWidget(QTreeWidget):
         super().insertTopLevelItems(index, items)
         self.showHideLabel()
 
+class TreeView(QtWidgets.QTreeView):
+    def __init__(self, parent=None, emptyText="Hint"):
+        super().__init__(parent=parent)
+        self.backgroundLabel = QLabel(self)
+        self.backgroundLabel.show()
+        self.openFileAction = self.doNothing
+        self.backgroundLabel.setAlignment(QtCore.Qt.AlignCenter)
+        self.backgroundLabel.setText(emptyText)
+        self.backgroundLabel.resize(250, 70)
+        self.setIconSize(QtCore.QSize(32, 32))
+        self.setAutoScroll(True)
+        self.setUniformRowHeights(True)
+        self.setVerticalScrollMode(QtWidgets.QTreeView.ScrollPerPixel)
+        self.setHorizontalScrollMode(QtWidgets.QTreeView.ScrollPerPixel)
+        self.setSelectionMode(QtWidgets.QTreeView.SelectionMode.ContiguousSelection)
+        self.setDropIndicatorShown(True)
+        self.setAcceptDrops(True)
+
+    def dragEnterEvent(self, e):
+        e.accept()
+
+    def dragMoveEvent(self, e):
+        e.accept()
+
+    def dropEvent(self, e):
+        self.openFileAction(str(e.mimeData().text().replace("file://", "")))
+
+    def resizeEvent(self, event) -> None:
+        eventResult = super().resizeEvent(event)
+        w, h = self.width(), self.height()
+        diffW = w-self.backgroundLabel.width()
+        diffH = h-self.backgroundLabel.height()
+        self.backgroundLabel.move(diffW//2, diffH//2)
+        return eventResult
+
+    def setEmptyText(self, text: str) -> None:
+        self.backgroundLabel.setText(text)
+
+    def connectFileDragEvent(self, func) -> None:
+        self.openFileAction = func
+
+    def doNothing(self, f: str) -> None:
+        log("[  WARN  ] File {f} dragged, but no actoin was defined for this event")
+
+    def showHideLabel(self) -> None:
+        if(self.model() and self.model().rowCount()>0):
+            self.backgroundLabel.hide()
+        else:
+            self.backgroundLabel.show()
+
+    def setModel(self, model: QtCore.QAbstractItemModel) -> None:
+        super().setModel(model)
+        if(model):
+            model.modelReset.connect(self.showHideLabel)
+            model.rowsInserted.connect(self.showHideLabel)
+            model.rowsRemoved.connect(self.showHideLabel)
+        self.showHideLabel()
+
+class ArchiveModel(QtCore.QAbstractItemModel):
+    # Serves an Engine.ArchiveIndex to a QTreeView. A folder's rows are only inserted when the view expands it
+    def __init__(self, archiveIndex: Engine.ArchiveIndex, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self.archiveIndex = archiveIndex
+        self.headers = ["Name", "Size", "Extract or skip"]
+        self.fetched = {0}
+        self.selection = Engine.Bitset(len(archiveIndex), True)
+        self.iconService = getIconService()
+        self.iconService.iconLoaded.connect(self.refreshIcons)
+
+    def getNode(self, index: QtCore.QModelIndex) -> int:
+        if(index.isValid()):
+            return index.internalId()
+        return 0
+
+    def getIndex(self, node: int, column: int = 0) -> QtCore.QModelIndex:
+        if(node == 0):
+            return QtCore.QModelIndex()
+        return self.createIndex(self.archiveIndex.getRow(node), column, node)
+
+    def index(self, row: int, column: int, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        node = self.getNode(parent)
+        if not(node in self.fetched) or row < 0 or row >= self.archiveIndex.getChildCount(node):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, self.archiveIndex.getChildren(node)[row])
+
+    def parent(self, index: QtCore.QModelIndex = None) -> QtCore.QModelIndex:
+        if(index == None):
+            return super().parent()
+        if not(index.isValid()):
+            return QtCore.QModelIndex()
+        return self.getIndex(self.archiveIndex.parents[index.internalId()])
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if(parent.column() > 0):
+            return 0
+        node = self.getNode(parent)
+        if(node in self.fetched):
+            return self.archiveIndex.getChildCount(node)
+        return 0
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return len(self.headers)
+
+    def hasChildren(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        if(parent.column() > 0):
+            return False
+        return self.archiveIndex.getChildCount(self.getNode(parent)) > 0
+
+    def canFetchMore(self, parent: QtCore.QModelIndex) -> bool:
+        node = self.getNode(parent)
+        return not(node in self.fetched) and self.archiveIndex.getChildCount(node) > 0
+
+    def fetchMore(self, parent: QtCore.QModelIndex) -> None:
+        node = self.getNode(parent)
+        if(node in self.fetched):
+            return
+        self.archiveIndex.getChildren(node)
+        self.beginInsertRows(parent, 0, self.archiveIndex.getChildCount(node)-1)
+        self.fetched.add(node)
+        self.endInsertRows()
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not(index.isValid()):
+            return None
+        node = index.internalId()
+        column = index.column()
+        checked = self.isChecked(node)
+        if(role == QtCore.Qt.DisplayRole):
+            if(column == 0):
+                return self.archiveIndex.names[node]
+            elif(column == 1):
+                return f"{self.archiveIndex.sizes[node]/1000000:.3f} MB"
+            elif(column == 2):
+                return "Extract" if checked else "Skip"
+        elif(role == QtCore.Qt.DecorationRole and column == 0):
+            if(self.archiveIndex.isFolder(node)):
+                return self.iconService.getFolderIcon()
+            return self.iconService.getIcon(self.archiveIndex.names[node])
+        elif(role == QtCore.Qt.ToolTipRole and self.archiveIndex.isFolder(node)):
+            return f"{self.archiveIndex.fileCounts[node]} files, {self.archiveIndex.sizes[node]/1000000:.3f} MB ({self.archiveIndex.compressedSizes[node]/1000000:.3f} MB compressed)"
+        elif(role == QtCore.Qt.CheckStateRole and column == 2):
+            return QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked
+        elif(role == QtCore.Qt.ForegroundRole and not(checked)):
+            return QtWidgets.QApplication.palette().brush(QtGui.QPalette.Disabled, QtGui.QPalette.Text)
+        return None
+
+    def setData(self, index: QtCore.QModelIndex, value, role: int = QtCore.Qt.EditRole) -> bool:
+        if not(index.isValid()) or index.column() != 2 or role != QtCore.Qt.CheckStateRole:
+            return False
+        self.setChecked(index.internalId(), value == QtCore.Qt.Checked)
+        return True
+
+    def isChecked(self, node: int) -> bool:
+        return self.selection.get(self.archiveIndex.positions[node])
+
+    def setChecked(self, node: int, checked: bool) -> None:
+        start, end = self.archiveIndex.getSubtreeRange(node)
+        self.selection.setRange(start, end, checked)
+        if(node != 0):
+            self.dataChanged.emit(self.getIndex(node, 0), self.getIndex(node, 2))
+        for folder in self.fetched:
+            if(start <= self.archiveIndex.positions[folder] < end):
+                self.emitRowsChanged(folder)
+
+    def emitRowsChanged(self, folder: int, roles: list = []) -> None:
+        count = self.archiveIndex.getChildCount(folder)
+        if(count > 0):
+            parent = self.getIndex(folder)
+            self.dataChanged.emit(self.index(0, 0, parent), self.index(count-1, len(self.headers)-1, parent), roles)
+
+    def refreshIcons(self, key: str, icon: QtGui.QIcon) -> None:
+        for folder in self.fetched:
+            self.emitRowsChanged(folder, [QtCore.Qt.DecorationRole])
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+        if not(index.isValid()):
+            return QtCore.Qt.NoItemFlags
+        if(index.column() == 2):
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsUserCheckable
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int = QtCore.Qt.DisplayRole):
+        if(orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole):
+            return self.headers[section]
+        return None
+
+    def getSelectionSnapshot(self) -> Engine.Bitset:
+        return self.selection.snapshot()
+
+class JobWatcher(QtCore.QObject):
+    # Follows an Engine.Job from the GUI thread, so the engine itself doesn't need to know about Qt.
+    # Progress is sent at a fixed rate (20 times per second by default), no matter how many files are done.
+    progressChanged = QtCore.Signal(object)
+    finished = QtCore.Signal(object)
+
+    def __init__(self, job: Engine.Job, parent=None, interval: int = 50):
+        super().__init__(parent)
+        self.job = job
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(interval)
+
+    def poll(self) -> None:
+        self.progressChanged.emit(self.job.getProgress())
+        if(self.job.isDone()):
+            self.timer.stop()
+            self.finished.emit(self.job)
+            self.deleteLater()
+
+
 class ProgressUpdater(QWidget):
     def __init__(self, parent: QtCore.QObject = None, window: QtWidgets.QMainWindow = None, processingText: str = "Compressing...", clickToStartText: str = "Click compress to start.") -> None:
         super().__init__(parent=parent)
@@ -162,28 +371,23 @@ class ProgressUpdater(QWidget):
         self.progressBar.setValue(value)
         if(_platform=="win32"): self.parentWindow.taskbprogress.setValue(value)
 
+    def setProgress(self, progress: Engine.JobProgress, action: str) -> None:
+        # The bar goes in thousandths of the total bytes, so big archives don't overflow it
+        self.setRange(0, 1000)
+        self.setValue(int(progress.getFraction()*1000))
+        details = f"{progress.done} out of {progress.total} files, {progress.speed/1000000:.2f} MB/s"
+        if(progress.eta >= 0):
+            details += f", {self.formatTime(progress.eta)} left"
+        if(progress.current != ""):
+            self.setText(f"{action} file \"{progress.current.split('/')[-1]}\" ({details})")
+        else:
+            self.setText(f"{action}... ({details})")
 
-class KillableThread(Thread): 
-    def __init__(self, *args, **keywords): 
-        Thread.__init__(self, *args, **keywords) 
-        self.shouldBeRuning = True
-
-    def start(self): 
-        self._run = self.run 
-        self.run = self.settrace_and_run
-        Thread.start(self) 
-
-    def settrace_and_run(self): 
-        sys.settrace(self.globaltrace) 
-        self._run()
-
-    def globaltrace(self, frame, event, arg): 
-        return self.localtrace if event == 'call' else None
-        
-    def localtrace(self, frame, event, arg): 
-        if not(self.shouldBeRuning) and event == 'line': 
-            raise SystemExit() 
-        return self.localtrace 
+    def formatTime(self, seconds: float) -> str:
+        seconds = int(seconds)
+        if(seconds >= 3600):
+            return f"{seconds//3600}:{seconds//60%60:02d}:{seconds%60:02d}"
+        return f"{seconds//60}:{seconds%60:02d}"
 
 
 class ComboBoxAction(QWidget):
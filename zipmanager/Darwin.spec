@@ -11,7 +11,7 @@ package_imports = [['qtmodern', ['resources/frameless.qss', 'resources/style.qss
 a = Analysis(['__init__.py'],
              pathex=['/Users/marticlilop/SPTPrograms/SomePythonThings-Zip-Manager/zipmanager'],
              binaries=[],
-             datas=[('res', 'res'), ('Compressor.py', '.'), ('Extractor.py', '.'), ('CustomWidgets.py', '.'), ('MainWindow.py', '.'), ('Tools.py', '.'), ('Updater.py', '.'), ('Welcome.py', '.')],
+             datas=[('res', 'res'), ('Compressor.py', '.'), ('Extractor.py', '.'), ('CustomWidgets.py', '.'), ('MainWindow.py', '.'), ('Tools.py', '.'), ('Updater.py', '.'), ('Welcome.py', '.'), ('Engine.py', '.'), ('Cli.py', '.')],
              hiddenimports=['pkg_resources.py2_warn', ".Tools.*", "json", "darkdetect", "qtmodern", "qt_thread_updater", "wget", "PySide2.*", "zipfile", "threading", "PySide2"],
              hookspath=[],
              runtime_hooks=[],
@@ -0,0 +1,2301 @@
+import os, zipfile, zlib, shutil, tempfile, threading, time, copy, queue, mmap, struct, hashlib
+from concurrent.futures import ThreadPoolExecutor, Future, wait as waitFutures
+from array import array
+from collections import Counter, deque
+from itertools import accumulate
+try:
+    import lzma
+except ImportError:
+    lzma = None # zipfile can't use LZMA either
+
+# This module must not import PySide2 (or Tools, which does), so it can be used without a GUI.
+
+chunkSize = 1024*1024
+spoolSize = 16*1024*1024
+deflateBlockSize = 4*1024*1024
+deflateWindowSize = 32*1024
+smallFileSize = 256*1024
+smallFilesBatchCount = 256
+smallFilesBatchBytes = 8*1024*1024
+
+ioBlockSize = 1024*1024
+ioQueueDepth = 4
+ioUseMmap = False
+
+scanBatchCount = 1000
+jobProgressInterval = 0.1
+speedWindow = 3
+
+indexMagic = b"SPTZIDX1"
+listingCacheTailSize = 64*1024
+blobMagic = b"SPTZBLB1"
+blobHeader = struct.Struct("<8sIQQH")
+blobCacheMinSize = 64*1024
+blobCacheLowWater = 0.9
+
+parallelDeflateAlgorithm = "Deflated (Parallel)"
+
+# Compress with the algorithm in brackets, but store the files that would not shrink
+autoAlgorithms = ["Auto (Deflated)", "Auto (BZIP2)", "Auto (LZMA)"]
+
+compressionTypes = {
+    "Deflated": zipfile.ZIP_DEFLATED,
+    parallelDeflateAlgorithm: zipfile.ZIP_DEFLATED,
+    "None": zipfile.ZIP_STORED,
+    "BZIP2": zipfile.ZIP_BZIP2,
+    "LZMA": zipfile.ZIP_LZMA,
+    "Auto (Deflated)": zipfile.ZIP_DEFLATED,
+    "Auto (BZIP2)": zipfile.ZIP_BZIP2,
+    "Auto (LZMA)": zipfile.ZIP_LZMA,
+}
+
+incompressibleExtensions = {
+    "jpg", "jpeg", "png", "gif", "webp", "heic", "heif", "avif", "jxl",
+    "mp3", "m4a", "aac", "ogg", "oga", "opus", "flac", "wma",
+    "mp4", "m4v", "mkv", "webm", "avi", "mov", "wmv", "flv", "3gp",
+    "zip", "7z", "rar", "gz", "tgz", "bz2", "tbz2", "xz", "txz", "zst", "lz4", "lzma", "cab", "zipx",
+    "jar", "apk", "aab", "ipa", "whl", "nupkg", "crx", "xpi", "appx", "msix",
+    "docx", "xlsx", "pptx", "odt", "ods", "odp", "epub", "woff", "woff2",
+}
+autoSampleSize = 64*1024
+autoMinSize = 4*1024
+autoStoreRatio = 0.95
+estimateSampleSize = 64*1024
+estimateMaxBlocks = 64
+estimateMaxFileBlocks = 16
+estimateBlockSpacing = 1024*1024
+lzmaMaxPreset = 6 # Higher presets need hundreds of MB of memory per thread
+budgetInterval = 0.25
+budgetMargin = 1.1
+budgetMinSampleBytes = 1024*1024
+budgetCalibrationBytes = 256*1024
+
+# How much longer than level 1 every level (from 1 to 9) takes to compress the same data. A budgeted job uses
+# these for the levels it didn't try yet, and the speeds it measured for the rest.
+levelCosts = {
+    zipfile.ZIP_DEFLATED: [1, 1.1, 1.35, 1.45, 1.95, 2.9, 3.65, 6.1, 10.4],
+    zipfile.ZIP_BZIP2: [1, 1.02, 1.05, 1.07, 1.1, 1.11, 1.12, 1.13, 1.13],
+    zipfile.ZIP_LZMA: [1, 1.6, 2.7, 4.65, 6.3, 8.45, 8.45, 8.45, 8.45],
+}
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class WriteBehindError(OSError):
+    # Data given to a WriteBehindFile may have been lost, so the whole file is unusable
+    pass
+
+
+class CancellationToken():
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self) -> None:
+        self.event.set()
+
+    def isCancelled(self) -> bool:
+        return self.event.is_set()
+
+    def check(self) -> None:
+        if(self.event.is_set()):
+            raise OperationCancelled()
+
+
+class ByteCounter():
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+        self.startTime = time.time()
+
+    def add(self, count: int) -> None:
+        with self.lock:
+            self.value += count
+
+    def getThroughput(self) -> float:
+        elapsed = time.time()-self.startTime
+        if(elapsed <= 0):
+            return 0
+        return self.value/elapsed
+
+
+def log(s: str) -> None:
+    pass
+
+def setLogger(logger) -> None:
+    global log
+    log = logger
+
+def getThreadCount(threads: int = 0) -> int:
+    if(threads > 0):
+        return threads
+    return os.cpu_count() or 1
+
+def getCompressionType(algorithm: str) -> int:
+    return compressionTypes.get(algorithm, zipfile.ZIP_DEFLATED)
+
+def isIncompressible(source: str, size: int) -> bool:
+    # Known compressed formats go by extension. Anything else is checked by quickly deflating its first block
+    if(os.path.splitext(source)[1][1:].lower() in incompressibleExtensions):
+        return True
+    if(size < autoMinSize):
+        return False
+    try:
+        with open(source, "rb") as f:
+            sample = f.read(autoSampleSize)
+    except OSError:
+        return False
+    return len(zlib.compress(sample, 1)) > len(sample)*autoStoreRatio
+
+def configureIO(blockSize: int = ioBlockSize, queueDepth: int = ioQueueDepth, useMmap: bool = ioUseMmap) -> None:
+    global ioBlockSize, ioQueueDepth, ioUseMmap
+    ioBlockSize = max(blockSize, 4096)
+    ioQueueDepth = max(queueDepth, 1)
+    ioUseMmap = useMmap
+    log(f"[        ] I/O block size set to {ioBlockSize} bytes, queue depth {ioQueueDepth}, mmap {'enabled' if ioUseMmap else 'disabled'}")
+
+def usePipelinedIO(size: int) -> bool:
+    # Starting the reader/writer threads only pays off when there are several blocks to move
+    return size >= ioBlockSize*2
+
+
+class ReadAheadReader():
+    # Reads a range of a file on a background thread, up to ioQueueDepth blocks ahead of the consumer
+    def __init__(self, path: str, offset: int = 0, length: int = -1):
+        self.queue = queue.Queue(maxsize=ioQueueDepth)
+        self.stopEvent = threading.Event()
+        self.block = b""
+        self.finished = False
+        self.thread = threading.Thread(target=self.readWorker, args=(path, offset, length, ioBlockSize, ioUseMmap), daemon=True)
+        self.thread.start()
+
+    def putBlock(self, block) -> bool:
+        while not(self.stopEvent.is_set()):
+            try:
+                self.queue.put(block, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def readWorker(self, path: str, offset: int, length: int, blockSize: int, useMmap: bool) -> None:
+        try:
+            with open(path, "rb") as f:
+                fileSize = os.fstat(f.fileno()).st_size
+                end = fileSize if length < 0 else min(offset+length, fileSize)
+                if(useMmap and end > offset):
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        position = offset
+                        while position < end:
+                            if not(self.putBlock(mm[position:min(position+blockSize, end)])):
+                                return
+                            position += blockSize
+                else:
+                    f.seek(offset)
+                    position = offset
+                    while position < end:
+                        block = f.read(min(blockSize, end-position))
+                        if not(block):
+                            break
+                        if not(self.putBlock(block)):
+                            return
+                        position += len(block)
+            self.putBlock(None)
+        except BaseException as e:
+            self.putBlock(e)
+
+    def nextBlock(self) -> bytes:
+        if(self.finished):
+            return b""
+        block = self.queue.get()
+        if(block == None):
+            self.finished = True
+            return b""
+        if(isinstance(block, BaseException)):
+            self.finished = True
+            raise block
+        return block
+
+    def read(self, n: int = -1) -> bytes:
+        if(n < 0):
+            data = [self.block]
+            self.block = b""
+            block = self.nextBlock()
+            while block:
+                data.append(block)
+                block = self.nextBlock()
+            return b"".join(data)
+        # Like a buffered file, only returns less than n bytes at the end of the range
+        data = []
+        size = 0
+        while size < n:
+            if not(self.block):
+                self.block = self.nextBlock()
+                if not(self.block):
+                    break
+            if(len(self.block) <= n-size):
+                data.append(self.block)
+                size += len(self.block)
+                self.block = b""
+            else:
+                data.append(self.block[:n-size])
+                self.block = self.block[n-size:]
+                size = n
+        return data[0] if len(data) == 1 else b"".join(data)
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        self.stopEvent.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class WriteBehindFile():
+    # A file opened for writing whose data is coalesced in ioBlockSize blocks and written by a
+    # background thread, so the caller can keep working while the disk is busy
+    def __init__(self, path: str, mode: str = "wb"):
+        self.path = path
+        self.file = open(path, mode, buffering=0)
+        self.position = self.file.tell()
+        self.blockSize = ioBlockSize
+        self.buffer = bytearray()
+        self.queue = queue.Queue(maxsize=ioQueueDepth)
+        self.error = None
+        self.thread = threading.Thread(target=self.writeWorker, daemon=True)
+        self.thread.start()
+
+    def writeWorker(self) -> None:
+        while True:
+            data = self.queue.get()
+            try:
+                if(data == None):
+                    return
+                if(self.error == None):
+                    view = memoryview(data)
+                    while len(view) > 0:
+                        view = view[self.file.write(view):]
+            except BaseException as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def checkError(self) -> None:
+        # The error is kept: every later call fails too, as the data written after it can't be trusted either
+        if(self.error != None):
+            raise WriteBehindError(f"Unable to write {self.path}: {self.error}") from self.error
+
+    def write(self, data) -> int:
+        self.checkError()
+        size = len(data)
+        if(len(self.buffer) == 0 and size >= self.blockSize):
+            self.queue.put(bytes(data))
+        else:
+            self.buffer += data
+            if(len(self.buffer) >= self.blockSize):
+                self.queue.put(bytes(self.buffer))
+                self.buffer = bytearray()
+        self.position += size
+        return size
+
+    def flush(self) -> None:
+        if(len(self.buffer) > 0):
+            self.queue.put(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.queue.join()
+        self.checkError()
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.flush()
+        try:
+            self.position = self.file.seek(offset, whence)
+        except OSError as e:
+            self.error = e
+            self.checkError()
+        return self.position
+
+    def seekable(self) -> bool:
+        return True
+
+    def truncate(self, size: int = None) -> int:
+        self.flush()
+        if(size == None):
+            size = self.position
+        try:
+            return self.file.truncate(size)
+        except OSError as e:
+            self.error = e
+            self.checkError()
+
+    def close(self) -> None:
+        if(self.file.closed):
+            return
+        try:
+            self.flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+def openSource(source: str, size: int):
+    if(usePipelinedIO(size)):
+        return ReadAheadReader(source)
+    return open(source, "rb")
+
+
+def scanFolder(folder: str, onEntries, token: CancellationToken = None) -> dict:
+    # Walks the tree once, breadth first, so every folder is reported before its children.
+    # Entries are (path, parent, isFolder, size) tuples. Returns the total size of every folder.
+    folder = folder.replace("\\", "/")
+    folders = [folder]
+    parents = {}
+    sizes = {folder: 0}
+    entries = []
+    i = 0
+    while i < len(folders):
+        if(token):
+            token.check()
+        path = folders[i]
+        i += 1
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    entryPath = path+"/"+entry.name
+                    try:
+                        isFolder = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        isFolder = False
+                    if(isFolder):
+                        folders.append(entryPath)
+                        parents[entryPath] = path
+                        sizes[entryPath] = 0
+                        entries.append((entryPath, path, True, 0))
+                    else:
+                        try:
+                            size = entry.stat().st_size
+                        except OSError:
+                            size = 0
+                        sizes[path] += size
+                        entries.append((entryPath, path, False, size))
+                    if(len(entries) >= scanBatchCount):
+                        onEntries(entries)
+                        entries = []
+        except OSError as e:
+            if(path == folder):
+                raise
+            log(f"[  WARN  ] Unable to scan folder {path}: {e}")
+    if(len(entries) > 0):
+        onEntries(entries)
+    for path in reversed(folders[1:]):
+        sizes[parents[path]] += sizes[path]
+    log(f"[   OK   ] Scanned {len(folders)} folders under {folder}")
+    return sizes
+
+def collectMembers(paths: list, token: CancellationToken = None) -> list:
+    # Same names the Compressor gives: files go to the root of the zip, and folders keep their own name on top
+    members = []
+    for path in paths:
+        path = os.path.abspath(path).replace("\\", "/")
+        if(os.path.isdir(path)):
+            skip = len(os.path.dirname(path).rstrip("/"))+1
+
+            def onEntries(entries: list) -> None:
+                for entryPath, parent, isFolder, size in entries:
+                    if not(isFolder):
+                        members.append((entryPath, entryPath[skip:]))
+
+            scanFolder(path, onEntries, token)
+        else:
+            members.append((path, os.path.basename(path)))
+    return members
+
+
+class LZMACompressor(zipfile.LZMACompressor):
+    # zipfile always uses the default preset, whatever the level is
+    def __init__(self, level: int):
+        super().__init__()
+        self.filters = [{"id": lzma.FILTER_LZMA1, "preset": min(max(level, 0), lzmaMaxPreset)}]
+
+    def _init(self) -> bytes:
+        props = lzma._encode_filter_properties(self.filters[0])
+        self._comp = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=self.filters)
+        return struct.pack("<BBH", 9, 4, len(props))+props
+
+
+def getCompressor(compress_type: int, level: int):
+    if(compress_type == zipfile.ZIP_LZMA and lzma != None):
+        return LZMACompressor(level)
+    return zipfile._get_compressor(compress_type, level)
+
+
+class CompressedMember():
+    def __init__(self, source: str, zinfo: zipfile.ZipInfo, payload=None, cached: bool = None):
+        self.source = source
+        self.zinfo = zinfo
+        self.payload = payload
+        self.cached = cached # None when the compression cache was not used for this member
+        self.autoStored = False
+        self.seconds = 0
+
+    def close(self) -> None:
+        if(self.payload):
+            self.payload.close()
+            self.payload = None
+
+
+def compressMember(source: str, arcname: str, compress_type: int, level: int, token: CancellationToken = None, onProgress=None, cache: "BlobCache" = None, autoStore: bool = False) -> CompressedMember:
+    startTime = time.perf_counter()
+    zinfo = zipfile.ZipInfo.from_file(source, arcname)
+    if(zinfo.is_dir()):
+        zinfo.CRC = 0
+        zinfo.compress_size = 0
+        return CompressedMember(source, zinfo)
+    autoStored = autoStore and compress_type != zipfile.ZIP_STORED and isIncompressible(source, zinfo.file_size)
+    if(autoStored):
+        compress_type = zipfile.ZIP_STORED
+    zinfo.compress_type = compress_type
+    zinfo._compresslevel = level
+    if(compress_type == zipfile.ZIP_LZMA):
+        zinfo.flag_bits |= 0x02 # Compressed data includes an end-of-stream marker, as zipfile does
+    digest = None
+    if(cache != None and cache.accepts(compress_type, zinfo.file_size)):
+        digest = cache.getDigest(source, zinfo.file_size, token)
+        member = cache.load(cache.getKey(digest, compress_type, level), source, zinfo)
+        if(member != None):
+            if(onProgress):
+                onProgress(zinfo.file_size)
+            return member
+        # The file is hashed again while it is compressed, so a file that changes in between is not cached with the wrong key
+        hasher = cache.getHasher()
+    compressor = getCompressor(compress_type, level)
+    payload = tempfile.SpooledTemporaryFile(max_size=spoolSize)
+    try:
+        crc = 0
+        size = 0
+        with openSource(source, zinfo.file_size) as f:
+            while True:
+                if(token):
+                    token.check()
+                data = f.read(chunkSize)
+                if not(data):
+                    break
+                size += len(data)
+                crc = zlib.crc32(data, crc)
+                if(digest != None):
+                    hasher.update(data)
+                if(onProgress):
+                    onProgress(len(data))
+                if(compressor):
+                    data = compressor.compress(data)
+                payload.write(data)
+        if(compressor):
+            payload.write(compressor.flush())
+        zinfo.file_size = size
+        zinfo.CRC = crc
+        zinfo.compress_size = payload.tell()
+        payload.seek(0)
+        if(digest != None and hasher.hexdigest() == digest):
+            cache.store(cache.getKey(digest, compress_type, level), zinfo, payload)
+            payload.seek(0)
+    except BaseException:
+        payload.close()
+        raise
+    member = CompressedMember(source, zinfo, payload, False if digest != None else None)
+    member.autoStored = autoStored
+    member.seconds = time.perf_counter()-startTime
+    return member
+
+
+def writeCompressedMember(zipObj: zipfile.ZipFile, member: CompressedMember, seek: bool = True) -> None:
+    zinfo = member.zinfo
+    with zipObj._lock:
+        if(zipObj._writing):
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+        if not(zinfo.external_attr):
+            zinfo.external_attr = 0o600 << 16
+        # Both seek() and tell() cost a system call, and seek() also flushes the write buffer, so callers
+        # that know the file is already at start_dir skip them and the offsets are computed instead
+        if(seek):
+            if(zipObj._seekable):
+                zipObj.fp.seek(zipObj.start_dir)
+            zipObj.start_dir = zipObj.fp.tell()
+        zinfo.header_offset = zipObj.start_dir
+        zipObj._writecheck(zinfo)
+        zipObj._didModify = True
+        header = zinfo.FileHeader(None)
+        zipObj.fp.write(header)
+        if(member.payload):
+            shutil.copyfileobj(member.payload, zipObj.fp, chunkSize)
+        zipObj.filelist.append(zinfo)
+        zipObj.NameToInfo[zinfo.filename] = zinfo
+        zipObj.start_dir = zinfo.header_offset+len(header)+zinfo.compress_size
+
+
+def isMemberUnchanged(zinfo: zipfile.ZipInfo, source: str, compress_type: int, verifyCrc: bool = False, token: CancellationToken = None, allowStored: bool = False) -> bool:
+    # Zip files store the modification time in local time with a resolution of two seconds
+    try:
+        st = os.stat(source)
+    except OSError:
+        return False
+    if(zinfo.file_size != st.st_size or not(zinfo.compress_type == compress_type or (allowStored and zinfo.compress_type == zipfile.ZIP_STORED))):
+        return False
+    mtime = time.localtime(st.st_mtime)
+    if(zinfo.date_time != tuple(mtime[0:5])+(mtime[5]//2*2,)):
+        return False
+    if(verifyCrc):
+        crc = 0
+        with openSource(source, st.st_size) as f:
+            while True:
+                if(token):
+                    token.check()
+                data = f.read(chunkSize)
+                if not(data):
+                    break
+                crc = zlib.crc32(data, crc)
+        if(crc != zinfo.CRC):
+            return False
+    return True
+
+
+def copyRawMember(zipObj: zipfile.ZipFile, source, zinfo: zipfile.ZipInfo, token: CancellationToken = None, seek: bool = True) -> None:
+    # Copies the local header, the compressed data and the data descriptor of a member of another
+    # zip file as they are. Nothing in them depends on where the member is, so they are not decompressed.
+    # As in writeCompressedMember, callers that know the file is already at start_dir skip the seek.
+    source.seek(zinfo.header_offset)
+    header = source.read(zipfile.sizeFileHeader)
+    if(len(header) != zipfile.sizeFileHeader or header[0:4] != zipfile.stringFileHeader):
+        raise zipfile.BadZipFile(f"Bad local file header for {zinfo.filename}")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    dataEnd = zinfo.header_offset+zipfile.sizeFileHeader+fields[zipfile._FH_FILENAME_LENGTH]+fields[zipfile._FH_EXTRA_FIELD_LENGTH]+zinfo.compress_size
+    end = dataEnd
+    if(zinfo.flag_bits & 0x08):
+        source.seek(dataEnd)
+        if(source.read(4) == b"PK\x07\x08"):
+            end += 4
+        end += 20 if zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT else 12
+    newInfo = copy.copy(zinfo)
+    with zipObj._lock:
+        if(zipObj._writing):
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+        if(seek):
+            if(zipObj._seekable):
+                zipObj.fp.seek(zipObj.start_dir)
+            zipObj.start_dir = zipObj.fp.tell()
+        newInfo.header_offset = zipObj.start_dir
+        zipObj._writecheck(newInfo)
+        zipObj._didModify = True
+        source.seek(zinfo.header_offset)
+        remaining = end-zinfo.header_offset
+        while remaining > 0:
+            if(token):
+                token.check()
+            data = source.read(min(chunkSize, remaining))
+            if not(data):
+                raise zipfile.BadZipFile(f"Member {zinfo.filename} is truncated")
+            zipObj.fp.write(data)
+            remaining -= len(data)
+        zipObj.filelist.append(newInfo)
+        zipObj.NameToInfo[newInfo.filename] = newInfo
+        zipObj.start_dir = end-zinfo.header_offset+newInfo.header_offset
+
+
+crc32Shifts = {}
+crc32ShiftsSize = 64
+
+def gf2MatrixTimes(matrix: list, vector: int) -> int:
+    result = 0
+    i = 0
+    while vector:
+        if(vector & 1):
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+def gf2MatrixSquare(matrix: list) -> list:
+    return [gf2MatrixTimes(matrix, matrix[n]) for n in range(32)]
+
+def getCrc32Shift(length: int) -> list:
+    # The operator that appends length zero bytes to a CRC-32, as zlib's crc32_combine() builds it.
+    # Every block of a member but the last one has the same length, so it is only built once.
+    shift = crc32Shifts.get(length)
+    if(shift != None):
+        return shift
+    shift = [1 << n for n in range(32)]
+    odd = [0xedb88320] + [1 << n for n in range(31)]
+    even = gf2MatrixSquare(odd)
+    odd = gf2MatrixSquare(even)
+    remaining = length
+    while True:
+        even = gf2MatrixSquare(odd)
+        if(remaining & 1):
+            shift = [gf2MatrixTimes(even, column) for column in shift]
+        remaining >>= 1
+        if(remaining == 0):
+            break
+        odd = gf2MatrixSquare(even)
+        if(remaining & 1):
+            shift = [gf2MatrixTimes(odd, column) for column in shift]
+        remaining >>= 1
+        if(remaining == 0):
+            break
+    if(len(crc32Shifts) >= crc32ShiftsSize):
+        crc32Shifts.clear()
+    crc32Shifts[length] = shift
+    return shift
+
+def crc32Combine(crc1: int, crc2: int, len2: int) -> int:
+    # Port of zlib's crc32_combine(), which the zlib module does not expose
+    if(len2 <= 0):
+        return crc1
+    return gf2MatrixTimes(getCrc32Shift(len2), crc1) ^ crc2
+
+def deflateBlock(data: bytes, dictionary: bytes, level: int, last: bool) -> tuple:
+    if(dictionary):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    # A sync flush ends the block on a byte boundary without the final-block bit, so the
+    # raw streams of consecutive blocks can be concatenated into a single DEFLATE stream
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.crc32(data), len(data)
+
+def writeBlockParallelMember(zipObj: zipfile.ZipFile, pool: ThreadPoolExecutor, source: str, arcname: str, level: int, threads: int, token: CancellationToken = None, onProgress=None, budget: "CompressionBudget" = None) -> bool:
+    zinfo = zipfile.ZipInfo.from_file(source, arcname)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo._compresslevel = level
+    zinfo.CRC = 0
+    zinfo.compress_size = 0
+    if not(zinfo.external_attr):
+        zinfo.external_attr = 0o600 << 16
+    zip64 = zinfo.file_size*1.05 > zipfile.ZIP64_LIMIT
+    if(zip64 and not zipObj._allowZip64):
+        raise zipfile.LargeZipFile("Filesize would require ZIP64 extensions")
+    with zipObj._lock:
+        if(zipObj._writing):
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+        zipObj.fp.seek(zipObj.start_dir)
+        zinfo.header_offset = zipObj.fp.tell()
+        zipObj._writecheck(zinfo)
+        zipObj._didModify = True
+        pending = []
+        try:
+            zipObj.fp.write(zinfo.FileHeader(zip64))
+            crc = 0
+            size = 0
+            compressSize = 0
+            with ReadAheadReader(source) as f:
+                data = f.read(deflateBlockSize)
+                dictionary = b""
+                while data or pending:
+                    while data and len(pending) < threads*2:
+                        nextData = f.read(deflateBlockSize)
+                        if(budget != None):
+                            pending.append(pool.submit(budget.timeDeflateBlock, data, dictionary, budget.getLevel(), not(nextData)))
+                        else:
+                            pending.append(pool.submit(deflateBlock, data, dictionary, level, not(nextData)))
+                        dictionary = data[-deflateWindowSize:]
+                        data = nextData
+                    compressed, blockCrc, blockSize = pending.pop(0).result()
+                    zipObj.fp.write(compressed)
+                    crc = crc32Combine(crc, blockCrc, blockSize)
+                    size += blockSize
+                    compressSize += len(compressed)
+                    if(onProgress):
+                        onProgress(blockSize)
+                    if(token):
+                        token.check()
+            if(size == 0):
+                compressed = zlib.compressobj(level, zlib.DEFLATED, -15).flush()
+                zipObj.fp.write(compressed)
+                compressSize = len(compressed)
+            if not(zip64) and compressSize > zipfile.ZIP64_LIMIT:
+                raise RuntimeError("Compressed size unexpectedly exceeded ZIP64 limit")
+            zinfo.file_size = size
+            zinfo.compress_size = compressSize
+            zinfo.CRC = crc
+            end = zipObj.fp.tell()
+            zipObj.fp.seek(zinfo.header_offset)
+            zipObj.fp.write(zinfo.FileHeader(zip64))
+            zipObj.fp.seek(end)
+        except BaseException as e:
+            for future in pending:
+                future.cancel()
+            zipObj.fp.seek(zinfo.header_offset)
+            zipObj.fp.truncate()
+            if(isinstance(e, OperationCancelled)):
+                return False
+            raise
+        zipObj.filelist.append(zinfo)
+        zipObj.NameToInfo[zinfo.filename] = zinfo
+        zipObj.start_dir = zipObj.fp.tell()
+    return True
+
+
+def discardCompressedBatch(future) -> None:
+    if not(future.cancelled()) and future.exception() == None:
+        for index, result in future.result():
+            if(isinstance(result, CompressedMember)):
+                result.close()
+
+
+class CompressionBudget():
+    # Picks the level of every batch of members (and of every block of the members deflated in parallel)
+    # so the job takes at most seconds, or compresses at least minSpeed bytes per second. The level given
+    # to the job is the highest one it uses.
+    def __init__(self, seconds: float = 0, minSpeed: float = 0):
+        self.seconds = seconds
+        self.minSpeed = minSpeed
+        self.lock = threading.Lock()
+        self.startTime = time.perf_counter()
+        self.compressStartTime = self.startTime
+        self.compress_type = zipfile.ZIP_STORED
+        self.maxLevel = 9
+        self.level = 9
+        self.threads = 1
+        self.parallelism = 1
+        self.totalBytes = 0
+        self.doneBytes = 0
+        self.calibration = {}
+        self.measuredBytes = Counter()
+        self.measuredSeconds = Counter()
+        self.levelBytes = Counter()
+        self.levelChanges = 0
+        self.lastDecision = 0
+        self.warned = False
+
+    def start(self) -> None:
+        self.startTime = time.perf_counter()
+
+    def setWork(self, compress_type: int, level: int, threads: int, totalBytes: int, largestMember: int = 0) -> None:
+        # largestMember is the biggest member that is not split in blocks, which only one thread can compress
+        self.compress_type = compress_type
+        self.maxLevel = self.level = min(max(level, 1), lzmaMaxPreset if compress_type == zipfile.ZIP_LZMA else 9)
+        self.threads = threads
+        self.parallelism = min(max(totalBytes/largestMember, 1), threads) if largestMember > 0 else threads
+        self.totalBytes = totalBytes
+        self.compressStartTime = time.perf_counter()
+        if(self.minSpeed > 0):
+            log(f"[  INFO  ] Compressing {totalBytes/1000000:.2f} MB at {self.minSpeed/1000000:.2f} MB/s or faster, with levels up to {self.maxLevel}")
+        else:
+            log(f"[  INFO  ] Compressing {totalBytes/1000000:.2f} MB in {self.seconds-(self.compressStartTime-self.startTime):.1f} s or less, with levels up to {self.maxLevel}")
+
+    def calibrate(self, members: list, sizes: list, autoStore: bool = False, token: CancellationToken = None) -> None:
+        # The first batches are submitted before any of them is done, and big members can't change their level
+        # once started, so the first members are sampled with the highest and the lowest level beforehand
+        if(self.compress_type not in levelCosts):
+            return
+        for level in sorted({self.maxLevel, 1}):
+            sampledBytes = seconds = 0
+            for (source, arcname), size in zip(members, sizes):
+                if(sampledBytes >= budgetCalibrationBytes):
+                    break
+                if(size <= 0):
+                    continue
+                if(token):
+                    token.check()
+                try:
+                    sampleIn, sampleOut, sampleSeconds = sampleCompression(source, size, self.compress_type, level, autoStore)
+                except OSError:
+                    continue
+                sampledBytes += sampleIn
+                seconds += sampleSeconds
+            if(sampledBytes > 0):
+                self.calibration[level] = seconds/sampledBytes
+
+    def addSample(self, level: int, size: int, seconds: float = None) -> None:
+        # Members that were not compressed (cached or stored) are done, but say nothing about the speed
+        with self.lock:
+            self.doneBytes += size
+            self.levelBytes[level] += size
+            if(seconds != None):
+                self.measuredBytes[level] += size
+                self.measuredSeconds[level] += seconds
+
+    def timeDeflateBlock(self, data: bytes, dictionary: bytes, level: int, last: bool) -> tuple:
+        startTime = time.perf_counter()
+        result = deflateBlock(data, dictionary, level, last)
+        self.addSample(level, len(data), time.perf_counter()-startTime)
+        return result
+
+    def getSecondsPerByte(self, level: int) -> float:
+        measured = {l: self.measuredSeconds[l]/self.measuredBytes[l] for l in self.measuredBytes if self.measuredBytes[l] >= budgetMinSampleBytes}
+        if(len(measured) == 0):
+            measured = self.calibration
+        if(len(measured) == 0):
+            return None
+        if(level in measured):
+            return measured[level]
+        nearest = min(measured, key=lambda l: abs(l-level))
+        costs = levelCosts[self.compress_type]
+        return measured[nearest]*costs[level-1]/costs[nearest-1]
+
+    def getLevel(self) -> int:
+        now = time.perf_counter()
+        if(self.compress_type not in levelCosts or now-self.lastDecision < budgetInterval):
+            return self.level
+        self.lastDecision = now
+        with self.lock:
+            remainingBytes = max(self.totalBytes-self.doneBytes, 0)
+            secondsPerByte = {level: self.getSecondsPerByte(level) for level in range(1, self.maxLevel+1)}
+            cpuSeconds = sum(self.measuredSeconds.values())
+        if(secondsPerByte[1] == None):
+            return self.level # Nothing measured yet
+        if(self.minSpeed > 0):
+            required = self.minSpeed
+        else:
+            remainingTime = self.seconds-(now-self.startTime)
+            required = remainingBytes/remainingTime if remainingTime > 0 else float("inf")
+        # The workers are not always all busy (slow reads, the writer thread, a few big members), so the
+        # parallelism is how many CPU seconds they spent compressing per second of the job
+        elapsed = now-self.compressStartTime
+        parallelism = min(max(cpuSeconds/elapsed, 1), self.threads) if elapsed > 1 else self.parallelism
+        level = 1
+        for candidate in range(self.maxLevel, 0, -1):
+            speed = parallelism/secondsPerByte[candidate] if secondsPerByte[candidate] > 0 else float("inf")
+            if(speed >= required*budgetMargin):
+                level = candidate
+                break
+        if(speed < required*budgetMargin and not(self.warned)):
+            self.warned = True
+            log(f"[  WARN  ] The compression budget can't be met: {required/1000000:.2f} MB/s are needed and level 1 is expected to compress at {speed/1000000:.2f} MB/s")
+        if(level != self.level):
+            log(f"[  INFO  ] Compression level changed from {self.level} to {level}: {remainingBytes/1000000:.2f} MB left, {required/1000000:.2f} MB/s needed and level {level} is expected to compress at {speed/1000000:.2f} MB/s")
+            self.levelChanges += 1
+            self.level = level
+        return self.level
+
+    def isMet(self) -> bool:
+        now = time.perf_counter()
+        if(self.minSpeed > 0):
+            return now-self.compressStartTime <= 0 or self.totalBytes/(now-self.compressStartTime) >= self.minSpeed
+        return now-self.startTime <= self.seconds
+
+    def getSummary(self) -> str:
+        return ", ".join(f"level {level}: {self.levelBytes[level]/1000000:.2f} MB" for level in sorted(self.levelBytes, reverse=True) if self.levelBytes[level] > 0)
+
+
+class ParallelCompressor():
+    def __init__(self, zipObj: zipfile.ZipFile, compress_type: int, level: int, threads: int = 0, blockThreshold: int = 0, cache: "BlobCache" = None, autoStore: bool = False, budget: CompressionBudget = None):
+        self.zipObj = zipObj
+        self.compress_type = compress_type
+        self.level = level
+        self.threads = getThreadCount(threads)
+        self.blockThreshold = blockThreshold
+        self.cache = cache
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.autoStore = autoStore
+        self.autoStoredMembers = 0
+        self.autoStoredBytes = 0
+        self.compressedBytes = 0
+        self.compressSeconds = 0
+        self.budget = budget
+
+    def useBlockParallelDeflate(self, size: int) -> bool:
+        return self.blockThreshold > 0 and self.compress_type == zipfile.ZIP_DEFLATED and size > self.blockThreshold
+
+    def getSavedSeconds(self) -> float:
+        # Estimated from how fast this job compressed the members it did compress
+        if(self.compressedBytes == 0):
+            return 0
+        return self.autoStoredBytes*self.compressSeconds/self.compressedBytes
+
+    def getMemberSize(self, source: str) -> int:
+        try:
+            return os.stat(source).st_size
+        except OSError:
+            return 0 # The worker will report the error
+
+    def compressBatch(self, indexes: list, members: list, onMembersStarted, token: CancellationToken, onProgress, level: int) -> list:
+        if(onMembersStarted):
+            onMembersStarted(indexes)
+        results = []
+        try:
+            for index in indexes:
+                source, arcname = members[index]
+                try:
+                    member = compressMember(source, arcname, self.compress_type, level, token, onProgress, self.cache, self.autoStore)
+                    if(self.budget != None):
+                        self.budget.addSample(level, member.zinfo.file_size, None if member.cached or member.autoStored else member.seconds)
+                    results.append((index, member))
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    results.append((index, e))
+        except BaseException:
+            for index, result in results:
+                if(isinstance(result, CompressedMember)):
+                    result.close()
+            raise
+        return results
+
+    def getNextBatch(self, members: list, nextMember: int) -> tuple:
+        # Small files are grouped in batches, so the per-task and per-callback overhead is paid once per batch
+        indexes = []
+        batchBytes = 0
+        while nextMember < len(members) and len(indexes) < smallFilesBatchCount and batchBytes < smallFilesBatchBytes:
+            size = self.getMemberSize(members[nextMember][0])
+            if(self.useBlockParallelDeflate(size) and not(self.autoStore and isIncompressible(members[nextMember][0], size))):
+                if(len(indexes) == 0):
+                    return [nextMember], True
+                break
+            if(size > smallFileSize and len(indexes) > 0):
+                break
+            indexes.append(nextMember)
+            batchBytes += size
+            nextMember += 1
+            if(size > smallFileSize):
+                break
+        return indexes, False
+
+    def compress(self, members: list, onMembersStarted=None, onMembersDone=None, onMemberFailed=None, token: CancellationToken = None, onProgress=None) -> bool:
+        # Members are compressed by a pool of threads (zlib, bz2 and lzma release the GIL while working)
+        # and written to the archive by this thread in the same order they were given. Big deflated
+        # members are instead split in blocks that are compressed by the same pool.
+        log(f"[        ] Compressing {len(members)} members using {self.threads} threads")
+        if(self.budget != None):
+            sizes = [self.getMemberSize(source) for source, arcname in members]
+            self.budget.setWork(self.compress_type, self.level, self.threads, sum(sizes), max([size for size in sizes if not(self.useBlockParallelDeflate(size))], default=0))
+            self.budget.calibrate(members, sizes, self.autoStore, token)
+        pending = []
+        nextMember = 0
+        cancelled = False
+        seek = True
+        pool = ThreadPoolExecutor(max_workers=self.threads)
+        try:
+            while nextMember < len(members) or len(pending) > 0:
+                while nextMember < len(members) and len(pending) < self.threads*2:
+                    indexes, blockParallel = self.getNextBatch(members, nextMember)
+                    if(blockParallel):
+                        pending.append((indexes, None))
+                    else:
+                        level = self.budget.getLevel() if self.budget != None else self.level
+                        pending.append((indexes, pool.submit(self.compressBatch, indexes, members, onMembersStarted, token, onProgress, level)))
+                    nextMember += len(indexes)
+                indexes, future = pending.pop(0)
+                try:
+                    if(future == None):
+                        index = indexes[0]
+                        log(f"[        ] Compressing {members[index][0]} in blocks of {deflateBlockSize} bytes")
+                        if(onMembersStarted):
+                            onMembersStarted(indexes)
+                        try:
+                            if not(writeBlockParallelMember(self.zipObj, pool, members[index][0], members[index][1], self.level, self.threads, token, onProgress, self.budget)):
+                                raise OperationCancelled()
+                            results = [(index, None)]
+                        except (OperationCancelled, WriteBehindError):
+                            raise
+                        except Exception as e:
+                            results = [(index, e)]
+                    else:
+                        results = future.result()
+                except OperationCancelled:
+                    cancelled = True
+                    break
+                doneIndexes = []
+                for index, result in results:
+                    if(isinstance(result, CompressedMember)):
+                        member = result
+                        if(member.cached == True):
+                            self.cacheHits += 1
+                        elif(member.cached == False):
+                            self.cacheMisses += 1
+                        if(member.autoStored):
+                            self.autoStoredMembers += 1
+                            self.autoStoredBytes += member.zinfo.file_size
+                        elif(member.cached != True and member.zinfo.compress_type != zipfile.ZIP_STORED):
+                            self.compressedBytes += member.zinfo.file_size
+                            self.compressSeconds += member.seconds
+                        # Only reading and compressing a source can fail a single member, an error
+                        # writing the archive fails the whole job
+                        try:
+                            writeCompressedMember(self.zipObj, member, seek)
+                            seek = False
+                        except BaseException:
+                            for otherIndex, other in results:
+                                if(isinstance(other, CompressedMember)):
+                                    other.close()
+                            raise
+                        finally:
+                            member.close()
+                    if(isinstance(result, Exception)):
+                        log(f"[ FAILED ] Unable to compress member {members[index][0]}: {result}")
+                        if(onMemberFailed):
+                            onMemberFailed(index, result)
+                    else:
+                        doneIndexes.append(index)
+                if(onMembersDone and len(doneIndexes) > 0):
+                    onMembersDone(doneIndexes)
+                if(token and token.isCancelled()):
+                    cancelled = True
+                    break
+        finally:
+            for indexes, future in pending:
+                if(future != None):
+                    future.cancel()
+                    future.add_done_callback(discardCompressedBatch)
+            pool.shutdown(wait=False)
+        return not(cancelled)
+
+
+def getExtractPath(zipObj: zipfile.ZipFile, member: zipfile.ZipInfo, directory: str) -> str:
+    # Same path sanitization as zipfile.ZipFile._extract_member
+    arcname = member.filename.replace('/', os.path.sep)
+    if(os.path.altsep):
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    arcname = os.path.sep.join(x for x in arcname.split(os.path.sep) if x not in ('', os.path.curdir, os.path.pardir))
+    if(os.path.sep == '\\'):
+        arcname = zipObj._sanitize_windows_name(arcname, os.path.sep)
+    return os.path.normpath(os.path.join(directory, arcname))
+
+def extractMember(zipObj: zipfile.ZipFile, member: zipfile.ZipInfo, directory: str, token: CancellationToken = None, onProgress=None, targetpath: str = "") -> str:
+    if(token):
+        token.check()
+    if(targetpath == ""):
+        targetpath = getExtractPath(zipObj, member, directory)
+        upperdirs = os.path.dirname(targetpath)
+        if(upperdirs and not(os.path.exists(upperdirs))):
+            os.makedirs(upperdirs, exist_ok=True)
+    if(member.is_dir()):
+        if not(os.path.isdir(targetpath)):
+            os.makedirs(targetpath, exist_ok=True)
+        return targetpath
+    with zipObj.open(member) as source, open(targetpath, "wb") as target:
+        try:
+            while True:
+                data = source.read(chunkSize)
+                if not(data):
+                    break
+                target.write(data)
+                if(onProgress):
+                    onProgress(len(data))
+                if(token):
+                    token.check()
+        except OperationCancelled:
+            target.close()
+            os.remove(targetpath)
+            raise
+    return targetpath
+
+def openPipelinedMember(zipObj: zipfile.ZipFile, member: zipfile.ZipInfo) -> zipfile.ZipExtFile:
+    # Like zipObj.open, but the compressed data is read ahead on another thread
+    with open(zipObj.filename, "rb") as f:
+        f.seek(member.header_offset)
+        header = f.read(zipfile.sizeFileHeader)
+    if(len(header) != zipfile.sizeFileHeader):
+        raise zipfile.BadZipFile("Truncated file header")
+    header = struct.unpack(zipfile.structFileHeader, header)
+    if(header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader):
+        raise zipfile.BadZipFile("Bad magic number for file header")
+    dataOffset = member.header_offset+zipfile.sizeFileHeader+header[zipfile._FH_FILENAME_LENGTH]+header[zipfile._FH_EXTRA_FIELD_LENGTH]
+    reader = ReadAheadReader(zipObj.filename, dataOffset, member.compress_size)
+    try:
+        return zipfile.ZipExtFile(reader, "r", member, close_fileobj=True)
+    except Exception:
+        reader.close()
+        raise
+
+def pipelinedExtractMember(zipObj: zipfile.ZipFile, member: zipfile.ZipInfo, directory: str, token: CancellationToken = None, onProgress=None, targetpath: str = "") -> str:
+    # Reading the compressed data, inflating it and writing the result run on three different threads
+    if(member.is_dir() or member.flag_bits & 0x1 or not(zipObj.filename)):
+        return extractMember(zipObj, member, directory, token, onProgress, targetpath)
+    if(token):
+        token.check()
+    if(targetpath == ""):
+        targetpath = getExtractPath(zipObj, member, directory)
+        upperdirs = os.path.dirname(targetpath)
+        if(upperdirs and not(os.path.exists(upperdirs))):
+            os.makedirs(upperdirs, exist_ok=True)
+    with openPipelinedMember(zipObj, member) as source, WriteBehindFile(targetpath, "wb") as target:
+        try:
+            while True:
+                data = source.read(ioBlockSize)
+                if not(data):
+                    break
+                target.write(data)
+                if(onProgress):
+                    onProgress(len(data))
+                if(token):
+                    token.check()
+        except OperationCancelled:
+            target.close()
+            os.remove(targetpath)
+            raise
+    return targetpath
+
+
+def testMember(zipObj: zipfile.ZipFile, member: zipfile.ZipInfo, token: CancellationToken = None, onProgress=None) -> None:
+    # The data goes nowhere: ZipExtFile raises BadZipFile when the CRC-32 doesn't match once the last byte is read
+    if(token):
+        token.check()
+    if(member.is_dir()):
+        return
+    if(usePipelinedIO(member.file_size) and not(member.flag_bits & 0x1) and zipObj.filename):
+        source = openPipelinedMember(zipObj, member)
+    else:
+        source = zipObj.open(member)
+    with source:
+        while True:
+            data = source.read(ioBlockSize)
+            if not(data):
+                break
+            if(onProgress):
+                onProgress(len(data))
+            if(token):
+                token.check()
+
+
+def cloneZipFile(zipObj: zipfile.ZipFile) -> zipfile.ZipFile:
+    # A read-only ZipFile with its own file handle that shares the already parsed central directory
+    clone = copy.copy(zipObj)
+    clone.fp = open(zipObj.filename, "rb")
+    clone._filePassed = 0
+    clone._fileRefCnt = 1
+    clone._lock = threading.RLock()
+    return clone
+
+
+class ParallelExtractor():
+    def __init__(self, zipPath: str, directory: str, threads: int = 0):
+        self.zipPath = zipPath
+        self.directory = directory
+        self.threads = getThreadCount(threads)
+        self.zipObj = None
+        self.handles = threading.local()
+        self.openHandles = []
+        self.lock = threading.Lock()
+
+    def getHandle(self) -> zipfile.ZipFile:
+        # Every worker thread reads the archive through its own handle, so reads don't fight over a shared file position
+        zipObj = getattr(self.handles, "zipObj", None)
+        if(zipObj == None):
+            zipObj = cloneZipFile(self.zipObj)
+            self.handles.zipObj = zipObj
+            with self.lock:
+                self.openHandles.append(zipObj)
+        return zipObj
+
+    def closeHandles(self) -> None:
+        with self.lock:
+            for zipObj in self.openHandles:
+                zipObj.close()
+            self.openHandles = []
+        self.zipObj.close()
+
+    def createDirectories(self, targets: list) -> None:
+        directories = set()
+        for member, targetpath in targets:
+            if(member.is_dir()):
+                directories.add(targetpath)
+            else:
+                directories.add(os.path.dirname(targetpath))
+        for directory in sorted(directories):
+            if(directory and not(os.path.isdir(directory))):
+                os.makedirs(directory, exist_ok=True)
+
+    def splitRanges(self, targets: list) -> list:
+        # Members are sorted by their position on the archive and split in ranges of similar size,
+        # several per thread so a range full of big files doesn't leave the other threads idle
+        targets = sorted(targets, key=lambda target: target[0].header_offset)
+        totalSize = sum(member.compress_size for member, targetpath in targets)
+        rangeSize = max(totalSize//(self.threads*4), 1)
+        ranges = []
+        currentRange = []
+        currentSize = 0
+        for target in targets:
+            currentRange.append(target)
+            currentSize += target[0].compress_size
+            if(currentSize >= rangeSize or len(currentRange) >= smallFilesBatchCount):
+                ranges.append(currentRange)
+                currentRange = []
+                currentSize = 0
+        if(len(currentRange) > 0):
+            ranges.append(currentRange)
+        return ranges
+
+    def extractTarget(self, zipObj: zipfile.ZipFile, member: zipfile.ZipInfo, targetpath: str, token: CancellationToken, onProgress) -> None:
+        if(usePipelinedIO(member.file_size)):
+            pipelinedExtractMember(zipObj, member, self.directory, token, onProgress, targetpath)
+        else:
+            extractMember(zipObj, member, self.directory, token, onProgress, targetpath)
+
+    def testTarget(self, zipObj: zipfile.ZipFile, member: zipfile.ZipInfo, targetpath: str, token: CancellationToken, onProgress) -> None:
+        testMember(zipObj, member, token, onProgress)
+
+    def processRange(self, targets: list, process, token: CancellationToken, onProgress, onMembersDone) -> list:
+        zipObj = self.getHandle()
+        errors = []
+        done = []
+        for member, targetpath in targets:
+            try:
+                process(zipObj, member, targetpath, token, onProgress)
+                done.append(member.filename)
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                if(process == self.testTarget):
+                    log(f"[  WARN  ] File {member.filename} is corrupt: {e}")
+                else:
+                    log(f"[  WARN  ] Unable to extract file {member.filename}: {e}")
+                errors.append((member.filename, e))
+            if(onMembersDone and len(done) > 0 and (len(done) >= smallFilesBatchCount or member.file_size > smallFileSize)):
+                onMembersDone(done)
+                done = []
+        if(onMembersDone and len(done) > 0):
+            onMembersDone(done)
+        return errors
+
+    def getMembers(self, names: list = None, indexes: list = None) -> list:
+        self.zipObj = zipObj = zipfile.ZipFile(self.zipPath)
+        if(indexes != None):
+            infolist = zipObj.infolist()
+            return [infolist[i] for i in indexes]
+        elif(names != None):
+            return [zipObj.getinfo(name) for name in names]
+        else:
+            return zipObj.infolist()
+
+    def extract(self, names: list = None, onMembersDone=None, token: CancellationToken = None, onProgress=None, indexes: list = None) -> list:
+        members = self.getMembers(names, indexes)
+        targets = [(member, getExtractPath(self.zipObj, member, self.directory)) for member in members]
+        log(f"[        ] Extracting {len(targets)} members using {self.threads} threads")
+        self.createDirectories(targets)
+        return self.run(targets, self.extractTarget, token, onProgress, onMembersDone)
+
+    def test(self, names: list = None, onMembersDone=None, token: CancellationToken = None, onProgress=None, indexes: list = None) -> list:
+        # Decompresses the members without writing them anywhere and returns the ones that failed
+        members = self.getMembers(names, indexes)
+        targets = [(member, "") for member in members]
+        log(f"[        ] Testing {len(targets)} members using {self.threads} threads")
+        return self.run(targets, self.testTarget, token, onProgress, onMembersDone)
+
+    def run(self, targets: list, process, token: CancellationToken, onProgress, onMembersDone) -> list:
+        errors = []
+        pool = ThreadPoolExecutor(max_workers=self.threads)
+        futures = [pool.submit(self.processRange, targetRange, process, token, onProgress, onMembersDone) for targetRange in self.splitRanges(targets)]
+        try:
+            for future in futures:
+                errors += future.result()
+        except OperationCancelled:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+            self.closeHandles()
+        return errors
+
+
+class CentralDirectory():
+    # Reads the central directory of a zip straight from a memory map into parallel arrays, one item
+    # per entry, instead of building a ZipInfo object for each one. Names stay as slices of the map
+    # and are only decoded when asked for. Anything unusual raises, so callers can use zipfile instead.
+    endRecord = struct.Struct(zipfile.structEndArchive)
+    endRecord64 = struct.Struct(zipfile.structEndArchive64)
+    endLocator64 = struct.Struct(zipfile.structEndArchive64Locator)
+    centralRecord = struct.Struct(zipfile.structCentralDir)
+
+    def __init__(self, zipPath: str):
+        self.file = open(zipPath, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.read()
+        except Exception:
+            self.close()
+            raise
+
+    def findEnd(self) -> tuple:
+        mm = self.map
+        end = mm.rfind(zipfile.stringEndArchive, max(len(mm)-self.endRecord.size-0xFFFF, 0))
+        if(end < 0):
+            raise zipfile.BadZipFile("End of central directory not found")
+        (_, disk, startDisk, _, count, size, offset, _) = self.endRecord.unpack_from(mm, end)
+        endStart = end
+        if(end >= self.endLocator64.size and mm[end-self.endLocator64.size:end-self.endLocator64.size+4] == zipfile.stringEndArchive64Locator):
+            (_, _, offset64, disks) = self.endLocator64.unpack_from(mm, end-self.endLocator64.size)
+            endStart = end-self.endLocator64.size-self.endRecord64.size
+            if(disks > 1 or endStart < 0 or mm[endStart:endStart+4] != zipfile.stringEndArchive64):
+                raise zipfile.BadZipFile("Unsupported ZIP64 end of central directory")
+            (_, _, _, _, disk, startDisk, _, count, size, offset) = self.endRecord64.unpack_from(mm, endStart)
+        if(disk != 0 or startDisk != 0):
+            raise zipfile.BadZipFile("Multi-disk archives are not supported")
+        # Data prepended to the archive, as in self-extracting ones, shifts every stored offset
+        concat = endStart-size-offset
+        if(concat < 0):
+            raise zipfile.BadZipFile("Bad central directory offset")
+        return (offset+concat, size, count, concat)
+
+    def read(self) -> None:
+        mm = self.map
+        start, size, count, concat = self.findEnd()
+        self.nameOffsets = array("q")
+        self.nameLengths = array("H")
+        self.flags = array("H")
+        self.methods = array("H")
+        self.crcs = array("I")
+        self.compressedSizes = array("q")
+        self.sizes = array("q")
+        self.headerOffsets = array("q")
+        addNameOffset, addNameLength, addFlag, addMethod, addCrc, addCompressedSize, addSize, addHeaderOffset = self.nameOffsets.append, self.nameLengths.append, self.flags.append, self.methods.append, self.crcs.append, self.compressedSizes.append, self.sizes.append, self.headerOffsets.append
+        unpack, recordSize, signature = self.centralRecord.unpack_from, self.centralRecord.size, zipfile.stringCentralDir
+        position, end = start, start+size
+        if(end > len(mm)):
+            raise zipfile.BadZipFile("Truncated central directory")
+        while position < end:
+            record = unpack(mm, position)
+            if(record[0] != signature):
+                raise zipfile.BadZipFile("Bad magic number for central directory")
+            nameLength, extraLength, commentLength = record[12], record[13], record[14]
+            compressedSize, fileSize, headerOffset = record[10], record[11], record[18]
+            if(compressedSize == 0xFFFFFFFF or fileSize == 0xFFFFFFFF or headerOffset == 0xFFFFFFFF):
+                fileSize, compressedSize, headerOffset = self.readZip64Extra(position+recordSize+nameLength, extraLength, fileSize, compressedSize, headerOffset)
+            addNameOffset(position+recordSize)
+            addNameLength(nameLength)
+            addFlag(record[5])
+            addMethod(record[6])
+            addCrc(record[9])
+            addCompressedSize(compressedSize)
+            addSize(fileSize)
+            addHeaderOffset(headerOffset+concat)
+            position += recordSize+nameLength+extraLength+commentLength
+        if(position != end):
+            raise zipfile.BadZipFile("Truncated central directory")
+        if(count != len(self.sizes)):
+            log(f"[  WARN  ] Central directory has {len(self.sizes)} entries, {count} expected")
+
+    def readZip64Extra(self, position: int, length: int, fileSize: int, compressedSize: int, headerOffset: int) -> tuple:
+        mm, end = self.map, position+length
+        while position+4 <= end:
+            (kind, size) = struct.unpack_from("<HH", mm, position)
+            if(kind == 1):
+                values = iter(struct.unpack_from(f"<{min(size, end-position-4)//8}Q", mm, position+4))
+                try:
+                    if(fileSize == 0xFFFFFFFF):
+                        fileSize = next(values)
+                    if(compressedSize == 0xFFFFFFFF):
+                        compressedSize = next(values)
+                    if(headerOffset == 0xFFFFFFFF):
+                        headerOffset = next(values)
+                except StopIteration:
+                    raise zipfile.BadZipFile("Corrupt ZIP64 extra field")
+                return (fileSize, compressedSize, headerOffset)
+            position += 4+size
+        raise zipfile.BadZipFile("Missing ZIP64 extra field")
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def getName(self, i: int) -> str:
+        # Same decoding as zipfile, so names match ZipInfo.filename and infolist() indexes line up
+        start = self.nameOffsets[i]
+        name = self.map[start:start+self.nameLengths[i]].decode("utf-8" if self.flags[i] & 0x800 else "cp437")
+        if("\0" in name):
+            name = name[:name.index("\0")]
+        if(os.sep != "/" and os.sep in name):
+            name = name.replace(os.sep, "/")
+        return name
+
+    def getEntries(self):
+        sizes, compressedSizes, methods, getName = self.sizes, self.compressedSizes, self.methods, self.getName
+        for i in range(len(sizes)):
+            yield (getName(i), sizes[i], compressedSizes[i], methods[i])
+
+    def close(self) -> None:
+        if(getattr(self, "map", None) != None):
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def readArchiveIndex(zipPath: str):
+    try:
+        with CentralDirectory(zipPath) as directory:
+            return ArchiveIndex(directory.getEntries())
+    except Exception as e:
+        log(f"[  WARN  ] Unable to read the central directory of {zipPath} directly ({e}), using zipfile")
+    with zipfile.ZipFile(zipPath) as zipObj:
+        return ArchiveIndex((info.filename, info.file_size, info.compress_size, info.compress_type) for info in zipObj.infolist())
+
+
+class Bitset():
+    # A fixed number of bits packed eight per byte. Ranges are filled a whole byte at a time.
+    # Snapshots are backed by bytes, so they can be handed to another thread and never change.
+    def __init__(self, size: int, value: bool = False, bits: bytes = None):
+        self.size = size
+        if(bits == None):
+            bits = bytearray(b"\xff" if value else b"\x00")*((size+7)//8)
+        self.bits = bits
+        self.lock = threading.Lock()
+
+    def get(self, index: int) -> bool:
+        return (self.bits[index >> 3] >> (index & 7)) & 1 == 1
+
+    def set(self, index: int, value: bool) -> None:
+        with self.lock:
+            if(value):
+                self.bits[index >> 3] |= 1 << (index & 7)
+            else:
+                self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xff
+
+    def setRange(self, start: int, end: int, value: bool) -> None:
+        with self.lock:
+            firstByte, lastByte = (start+7) >> 3, end >> 3
+            if(firstByte >= lastByte):
+                edges = range(start, end)
+            else:
+                self.bits[firstByte:lastByte] = (b"\xff" if value else b"\x00")*(lastByte-firstByte)
+                edges = list(range(start, firstByte << 3))+list(range(lastByte << 3, end))
+            for index in edges:
+                if(value):
+                    self.bits[index >> 3] |= 1 << (index & 7)
+                else:
+                    self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xff
+
+    def count(self) -> int:
+        return bin(int.from_bytes(self.bits, "little") & ((1 << self.size)-1)).count("1")
+
+    def snapshot(self):
+        with self.lock:
+            return Bitset(self.size, bits=bytes(self.bits))
+
+
+class ArchiveIndex():
+    # The entries of an archive as a path trie stored in parallel arrays indexed by node id. Node 0
+    # is the root, and every folder gets exactly one node, keyed by its full path, whether or not
+    # the archive has an entry for it. Folder sizes and file counts are totals of their subtree.
+    arrayFields = ["parents", "members", "sizes", "compressedSizes", "fileCounts", "nodeCounts", "positions", "childOffsets", "childNodes"]
+
+    def __init__(self, entries=None):
+        self.sortedChildren = {}
+        if(entries != None):
+            self.build(entries)
+
+    def build(self, entries) -> None:
+        # entries yields (filename, file_size, compress_size, compress_type) in central directory order
+        self.names = [""]
+        self.parents = array("q", [-1])
+        self.members = array("q", [-1])
+        self.sizes = array("q", [0])
+        self.compressedSizes = array("q", [0])
+        self.fileCounts = array("q", [0])
+        self.folders = bytearray(b"\x01")
+        self.memberNames = []
+        self.compressTypes = set()
+        folderIds = {"": 0}
+        # This loop runs once per member, so the appends are looked up only once
+        addName, addParent, addMember, addSize, addCompressedSize, addFileCount, addFolder = self.names.append, self.parents.append, self.members.append, self.sizes.append, self.compressedSizes.append, self.fileCounts.append, self.folders.append
+        getFolder = self.getFolder
+        for i, (filename, size, compressedSize, compressType) in enumerate(entries):
+            self.memberNames.append(filename)
+            self.compressTypes.add(compressType)
+            if(filename[-1:] == "/"):
+                path = filename.rstrip("/")
+                if(path != ""):
+                    self.members[getFolder(folderIds, path)] = i
+                continue
+            slash = filename.rfind("/")
+            if(slash < 0):
+                parent = 0
+            else:
+                parent = folderIds.get(filename[:slash])
+                if(parent == None):
+                    parent = getFolder(folderIds, filename[:slash])
+            addName(filename[slash+1:])
+            addParent(parent)
+            addMember(i)
+            addSize(size)
+            addCompressedSize(compressedSize)
+            addFileCount(1)
+            addFolder(False)
+        self.nodeCounts = array("q", [1])*len(self.names)
+        self.buildTotals()
+        self.buildPositions()
+        self.buildChildren()
+        log(f"[   OK   ] Indexed {len(self.memberNames)} members in {len(self.names)} nodes")
+
+    def addNode(self, name: str, parent: int, member: int, size: int, compressedSize: int, fileCount: int, folder: bool) -> int:
+        self.names.append(name)
+        self.parents.append(parent)
+        self.members.append(member)
+        self.sizes.append(size)
+        self.compressedSizes.append(compressedSize)
+        self.fileCounts.append(fileCount)
+        self.folders.append(folder)
+        return len(self.names)-1
+
+    def getFolder(self, folderIds: dict, path: str) -> int:
+        node = folderIds.get(path)
+        if(node == None):
+            slash = path.rfind("/")
+            parent = self.getFolder(folderIds, path[:slash]) if slash >= 0 else 0
+            node = self.addNode(path[slash+1:], parent, -1, 0, 0, 0, True)
+            folderIds[path] = node
+        return node
+
+    def buildTotals(self) -> None:
+        # A folder is always created before anything inside it, so walking the ids backwards visits children first
+        parents, sizes, compressedSizes, fileCounts, nodeCounts = self.parents, self.sizes, self.compressedSizes, self.fileCounts, self.nodeCounts
+        for node in range(len(self.names)-1, 0, -1):
+            parent = parents[node]
+            sizes[parent] += sizes[node]
+            compressedSizes[parent] += compressedSizes[node]
+            fileCounts[parent] += fileCounts[node]
+            nodeCounts[parent] += nodeCounts[node]
+
+    def buildPositions(self) -> None:
+        # Numbers the nodes depth first, so the subtree of any node is the range of positions
+        # [positions[node], positions[node]+nodeCounts[node])
+        count = len(self.names)
+        parents, nodeCounts = self.parents, self.nodeCounts
+        self.positions = positions = array("q", bytes(8*count))
+        nextPositions = array("q", bytes(8*count))
+        nextPositions[0] = 1
+        for node in range(1, count):
+            parent = parents[node]
+            position = nextPositions[parent]
+            positions[node] = position
+            nextPositions[parent] = position+nodeCounts[node]
+            nextPositions[node] = position+1
+
+    def getSubtreeRange(self, node: int) -> tuple:
+        return self.positions[node], self.positions[node]+self.nodeCounts[node]
+
+    def buildChildren(self) -> None:
+        # A stable sort of the node ids by parent leaves the children of every node next to each other
+        count = len(self.names)
+        childCounts = array("q", bytes(8*(count+1)))
+        for parent, childCount in Counter(self.parents[1:]).items():
+            childCounts[parent+1] = childCount
+        self.childOffsets = array("q", accumulate(childCounts))
+        self.childNodes = array("q", sorted(range(1, count), key=self.parents.__getitem__))
+        self.rows = array("q", bytes(8*count))
+
+    def serialize(self) -> bytes:
+        blobs = [getattr(self, field).tobytes() for field in self.arrayFields]
+        blobs.append(bytes(self.folders))
+        blobs.append(array("q", sorted(self.compressTypes)).tobytes())
+        blobs.append("\0".join(self.names).encode("utf-8", "surrogateescape"))
+        blobs.append("\0".join(self.memberNames).encode("utf-8", "surrogateescape"))
+        header = struct.pack(f"<8sQQ{len(blobs)}Q", indexMagic, len(self.names), len(self.memberNames), *[len(blob) for blob in blobs])
+        return header+b"".join(blobs)
+
+    def deserialize(self, data: bytes) -> None:
+        blobCount = len(self.arrayFields)+4
+        headerFormat = f"<8sQQ{blobCount}Q"
+        header = struct.unpack_from(headerFormat, data)
+        if(header[0] != indexMagic):
+            raise ValueError("Not an archive index")
+        nodeCount, memberCount, lengths = header[1], header[2], header[3:]
+        view = memoryview(data)
+        blobs = []
+        position = struct.calcsize(headerFormat)
+        for length in lengths:
+            blobs.append(view[position:position+length])
+            position += length
+        for field, blob in zip(self.arrayFields, blobs):
+            values = array("q")
+            values.frombytes(blob)
+            setattr(self, field, values)
+        self.folders = bytearray(blobs[-4])
+        self.compressTypes = set(array("q", bytes(blobs[-3])))
+        self.names = str(blobs[-2], "utf-8", "surrogateescape").split("\0")
+        self.memberNames = str(blobs[-1], "utf-8", "surrogateescape").split("\0") if memberCount > 0 else []
+        if(len(self.names) != nodeCount or len(self.memberNames) != memberCount or len(self.parents) != nodeCount):
+            raise ValueError("Truncated archive index")
+        self.rows = array("q", bytes(8*nodeCount))
+        self.sortedChildren = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def isFolder(self, node: int) -> bool:
+        return self.folders[node] == 1
+
+    def getChildCount(self, node: int) -> int:
+        return self.childOffsets[node+1]-self.childOffsets[node]
+
+    def getChildren(self, node: int) -> list:
+        children = self.sortedChildren.get(node)
+        if(children == None):
+            children = sorted(self.childNodes[self.childOffsets[node]:self.childOffsets[node+1]], key=lambda child: (not(self.folders[child]), self.names[child].lower()))
+            for row, child in enumerate(children):
+                self.rows[child] = row
+            self.sortedChildren[node] = children
+        return children
+
+    def getRow(self, node: int) -> int:
+        self.getChildren(self.parents[node])
+        return self.rows[node]
+
+    def getPath(self, node: int) -> str:
+        names = []
+        while node > 0:
+            names.append(self.names[node])
+            node = self.parents[node]
+        return "/".join(reversed(names))
+
+    def getMemberName(self, node: int) -> str:
+        member = self.members[node]
+        return self.memberNames[member] if member >= 0 else ""
+
+    def getSelectedMembers(self, selection: Bitset) -> list:
+        # selection holds one bit per node position, as returned by getSubtreeRange
+        positions, get = self.positions, selection.get
+        return [member for node, member in enumerate(self.members) if member >= 0 and get(positions[node])]
+
+
+class ListingCache():
+    # Keeps serialized ArchiveIndex objects on disk, so reopening a big archive is a single read.
+    # Entries are keyed by path, size, modification time and a hash of the end of the archive,
+    # where the central directory and its end record live. The least recently used go first.
+    def __init__(self, directory: str, maxSize: int):
+        self.directory = directory
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+
+    def getKey(self, zipPath: str) -> str:
+        zipPath = os.path.realpath(zipPath)
+        stat = os.stat(zipPath)
+        key = hashlib.sha1(f"{zipPath}|{stat.st_size}|{stat.st_mtime_ns}|".encode("utf-8", "surrogateescape"))
+        with open(zipPath, "rb") as f:
+            f.seek(max(stat.st_size-listingCacheTailSize, 0))
+            key.update(f.read(listingCacheTailSize))
+        return key.hexdigest()
+
+    def getPath(self, key: str) -> str:
+        return os.path.join(self.directory, key+".idx")
+
+    def load(self, zipPath: str) -> ArchiveIndex:
+        if(self.maxSize <= 0):
+            return None
+        try:
+            path = self.getPath(self.getKey(zipPath))
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            index = ArchiveIndex()
+            index.deserialize(data)
+            os.utime(path)
+            log(f"[   OK   ] Loaded the listing of {zipPath} from the cache ({len(data)/1000000:.2f} MB)")
+            return index
+        except Exception as e:
+            log(f"[  WARN  ] Discarding cached listing of {zipPath}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def store(self, zipPath: str, index: ArchiveIndex) -> None:
+        if(self.maxSize <= 0):
+            return
+        try:
+            data = index.serialize()
+            if(len(data) > self.maxSize):
+                return
+            path = self.getPath(self.getKey(zipPath))
+            with self.lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path+".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path+".tmp", path)
+                self.evict()
+            log(f"[   OK   ] Cached the listing of {zipPath} ({len(data)/1000000:.2f} MB)")
+        except Exception as e:
+            log(f"[  WARN  ] Unable to cache the listing of {zipPath}: {e}")
+
+    def evict(self) -> None:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if(entry.name.endswith(".idx")):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        totalSize = sum(entry[1] for entry in entries)
+        for mtime, size, path in entries:
+            if(totalSize <= self.maxSize):
+                break
+            os.remove(path)
+            totalSize -= size
+
+
+class BlobCache():
+    # Keeps the compressed data of members on disk, keyed by a hash of the uncompressed contents, the
+    # compression method and the level, so a file that is added to many archives is compressed once.
+    # Several jobs (and processes) can share a directory: entries are written to a temporary file and
+    # renamed, and a missing or broken entry is a miss. The least recently used go first.
+    def __init__(self, directory: str, maxSize: int):
+        self.directory = directory
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+        self.size = -1 # Unknown until the directory is scanned
+        self.hits = 0
+        self.misses = 0
+
+    def accepts(self, compress_type: int, size: int) -> bool:
+        # Stored members would be copied anyway, and small ones compress faster than a cache lookup
+        return self.maxSize > 0 and compress_type != zipfile.ZIP_STORED and size >= blobCacheMinSize
+
+    def getHasher(self):
+        return hashlib.blake2b(digest_size=20)
+
+    def getDigest(self, source: str, size: int, token: CancellationToken = None) -> str:
+        hasher = self.getHasher()
+        with openSource(source, size) as f:
+            while True:
+                if(token):
+                    token.check()
+                data = f.read(chunkSize)
+                if not(data):
+                    break
+                hasher.update(data)
+        return hasher.hexdigest()
+
+    def getKey(self, digest: str, compress_type: int, level: int) -> str:
+        return f"{digest}-{compress_type}-{level}"
+
+    def getPath(self, key: str) -> str:
+        return os.path.join(self.directory, key+".blob")
+
+    def load(self, key: str, source: str, zinfo: zipfile.ZipInfo) -> CompressedMember:
+        path = self.getPath(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        size = 0
+        try:
+            size = os.fstat(f.fileno()).st_size
+            magic, crc, fileSize, compressSize, flagBits = blobHeader.unpack(f.read(blobHeader.size))
+            if(magic != blobMagic or fileSize != zinfo.file_size or compressSize != size-blobHeader.size):
+                raise ValueError("invalid header")
+        except Exception as e:
+            f.close()
+            log(f"[  WARN  ] Discarding cached compressed data of {source}: {e}")
+            self.removeEntry(path, size)
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        zinfo.CRC = crc
+        zinfo.compress_size = compressSize
+        zinfo.flag_bits = flagBits
+        with self.lock:
+            self.hits += 1
+        return CompressedMember(source, zinfo, f, True)
+
+    def store(self, key: str, zinfo: zipfile.ZipInfo, payload) -> None:
+        tempPath = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tempPath = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                f.write(blobHeader.pack(blobMagic, zinfo.CRC, zinfo.file_size, zinfo.compress_size, zinfo.flag_bits))
+                shutil.copyfileobj(payload, f, chunkSize)
+            path = self.getPath(key)
+            try:
+                replacedSize = os.stat(path).st_size # Another job may have stored the same entry meanwhile
+            except OSError:
+                replacedSize = 0
+            os.replace(tempPath, path)
+        except Exception as e:
+            log(f"[  WARN  ] Unable to cache the compressed data of {zinfo.filename}: {e}")
+            if(tempPath != None):
+                try:
+                    os.remove(tempPath)
+                except OSError:
+                    pass
+            return
+        with self.lock:
+            if(self.size >= 0):
+                self.size += blobHeader.size+zinfo.compress_size-replacedSize
+            if(self.size < 0 or self.size > self.maxSize):
+                self.evict()
+
+    def removeEntry(self, path: str, size: int) -> None:
+        # For entries removed outside evict(), which recounts the size of the directory itself
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            if(self.size >= 0):
+                self.size = max(self.size-size, 0)
+
+    def evict(self) -> None:
+        # Called with the lock held. Goes a bit below maxSize, so the directory is not scanned on every store
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if(entry.name.endswith(".blob")):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        entries.sort()
+        self.size = sum(entry[1] for entry in entries)
+        if(self.size <= self.maxSize):
+            return
+        for mtime, size, path in entries:
+            if(self.size <= self.maxSize*blobCacheLowWater):
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+            except OSError:
+                pass # Still open on Windows, or removed by another process
+
+
+class JobProgress():
+    # Members are counted in done/total, and their uncompressed size in bytes/totalBytes. speed is
+    # measured over the last few seconds and eta is -1 while it can't be estimated yet.
+    def __init__(self, done: int, total: int, bytes: int, totalBytes: int, seconds: float, speed: float, failed: int, current: str):
+        self.done = done
+        self.total = total
+        self.bytes = bytes
+        self.totalBytes = totalBytes
+        self.seconds = seconds
+        self.speed = speed
+        self.failed = failed
+        self.current = current
+        self.averageSpeed = bytes/seconds if seconds > 0 else 0
+        self.eta = max(totalBytes-bytes, 0)/speed if speed > 0 and totalBytes > 0 else -1
+
+    def getFraction(self) -> float:
+        if(self.totalBytes > 0):
+            return min(self.bytes/self.totalBytes, 1)
+        elif(self.total > 0):
+            return min(self.done/self.total, 1)
+        return 0
+
+
+class Job():
+    # A compression, extraction or test running on a thread of its own. Wait for it with result(),
+    # or from asyncio with "await job", and use "async for progress in job" to follow it. Cancelled
+    # jobs raise OperationCancelled, and the result is the list of (member, exception) that failed.
+    def __init__(self, token: CancellationToken = None):
+        self.token = token if token != None else CancellationToken()
+        self.counter = ByteCounter()
+        self.total = 0
+        self.totalBytes = 0
+        self.done = 0
+        self.current = ""
+        self.errors = []
+        self.stats = Counter()
+        self.speedSamples = deque()
+        self.lock = threading.Lock()
+        self.future = Future()
+        self.thread = None
+
+    def start(self, target) -> "Job":
+        def run() -> None:
+            if not(self.future.set_running_or_notify_cancel()):
+                return
+            try:
+                self.future.set_result(target(self))
+            except BaseException as e:
+                self.future.set_exception(e)
+
+        self.counter.startTime = time.time()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return self
+
+    def addDone(self, count: int, current: str = "") -> None:
+        with self.lock:
+            self.done += count
+            if(current != ""):
+                self.current = current
+
+    def addError(self, name: str, e: Exception) -> None:
+        with self.lock:
+            self.errors.append((name, e))
+
+    def addStat(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += value
+
+    def getProgress(self) -> JobProgress:
+        with self.lock:
+            now = time.time()
+            value = self.counter.value
+            samples = self.speedSamples
+            samples.append((now, value))
+            while len(samples) > 2 and now-samples[1][0] >= speedWindow:
+                samples.popleft()
+            elapsed = now-samples[0][0]
+            if(elapsed < 0.5):
+                elapsed = now-self.counter.startTime
+                speed = value/elapsed if elapsed > 0 else 0
+            else:
+                speed = (value-samples[0][1])/elapsed
+            return JobProgress(self.done, self.total, value, self.totalBytes, now-self.counter.startTime, speed, len(self.errors), self.current)
+
+    def cancel(self) -> None:
+        self.token.cancel()
+
+    def isDone(self) -> bool:
+        return self.future.done()
+
+    def join(self, timeout: float = None) -> bool:
+        waitFutures([self.future], timeout)
+        return self.future.done()
+
+    def result(self, timeout: float = None) -> list:
+        return self.future.result(timeout)
+
+    async def wait(self) -> list:
+        import asyncio
+        try:
+            return await asyncio.wrap_future(self.future)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    def __await__(self):
+        return self.wait().__await__()
+
+    async def __aiter__(self):
+        import asyncio
+        waiter = asyncio.wrap_future(self.future)
+        while not(waiter.done()):
+            await asyncio.wait([waiter], timeout=jobProgressInterval)
+            yield self.getProgress()
+        if not(waiter.cancelled()):
+            waiter.exception() # Raised by "await job", not here
+
+
+def getMembersSize(zipPath: str, names: list = None, indexes: list = None) -> tuple:
+    # Returns how many members would be extracted and their uncompressed size, without building ZipInfo objects
+    try:
+        with CentralDirectory(zipPath) as directory:
+            sizes = directory.sizes
+            if(names != None):
+                nameIndexes = {directory.getName(i): i for i in range(len(directory))}
+                indexes = [nameIndexes[name] for name in names]
+            if(indexes != None):
+                return (len(indexes), sum(sizes[i] for i in indexes))
+            return (len(sizes), sum(sizes))
+    except Exception:
+        with zipfile.ZipFile(zipPath) as zipObj:
+            infolist = zipObj.infolist()
+            if(names != None):
+                members = [zipObj.getinfo(name) for name in names]
+            elif(indexes != None):
+                members = [infolist[i] for i in indexes]
+            else:
+                members = infolist
+            return (len(members), sum(member.file_size for member in members))
+
+def getSourcesSize(members: list, token: CancellationToken = None) -> int:
+    size = 0
+    for i, (source, arcname) in enumerate(members):
+        if(token and i % smallFilesBatchCount == 0):
+            token.check()
+        try:
+            size += os.path.getsize(source)
+        except OSError:
+            pass
+    return size
+
+class CompressionEstimate():
+    # size is the predicted size of the zip file and seconds the predicted wall time, for inputBytes of data
+    def __init__(self, size: int, seconds: float, inputBytes: int, members: int, sampledBytes: int):
+        self.size = size
+        self.seconds = seconds
+        self.inputBytes = inputBytes
+        self.members = members
+        self.sampledBytes = sampledBytes
+        self.ratio = size/inputBytes if inputBytes > 0 else 1
+
+
+def getSampleBlocks(size: int) -> int:
+    # One block per estimateBlockSpacing bytes, so big files with parts of different kinds are not judged by a single one
+    return min(max(-(-size//estimateBlockSpacing), 1), estimateMaxFileBlocks)
+
+
+def sampleCompression(source: str, size: int, compress_type: int, level: int, autoStore: bool = False, blocks: int = 1) -> tuple:
+    # Compresses blocks spread evenly over the file (or all of it, if it is small) and returns (bytes in, bytes out, seconds)
+    length = min(size, estimateSampleSize)
+    blocks = min(blocks, max(size//max(length, 1), 1))
+    if(compress_type == zipfile.ZIP_STORED or (autoStore and isIncompressible(source, size))):
+        return length*blocks, length*blocks, 0
+    sampledBytes = compressedSize = seconds = 0
+    with open(source, "rb") as f:
+        for i in range(blocks):
+            f.seek((size-length)*(2*i+1)//(2*blocks))
+            data = f.read(length)
+            if not(data):
+                break
+            startTime = time.perf_counter()
+            compressor = getCompressor(compress_type, level)
+            compressedSize += len(compressor.compress(data))+len(compressor.flush())
+            seconds += time.perf_counter()-startTime
+            sampledBytes += len(data)
+    return sampledBytes, compressedSize, seconds
+
+
+def estimateCompression(members: list, algorithm: str = "Deflated", level: int = 5, threads: int = 0, blockThreshold: int = 64*1000000, token: CancellationToken = None) -> CompressionEstimate:
+    # members are (path, name on the zip) tuples. Files are grouped by extension and by size (in steps of 16x),
+    # a few files of every group are sampled in blocks spread over them, and each group is extrapolated from its own
+    # samples. Groups left without samples, when there are more groups than estimateMaxBlocks, use the average of all of them.
+    compress_type = getCompressionType(algorithm)
+    autoStore = algorithm in autoAlgorithms
+    groups = {}
+    inputBytes = 0
+    headersSize = zipfile.sizeEndCentDir
+    count = 0
+    for i, (source, arcname) in enumerate(members):
+        if(token and i % smallFilesBatchCount == 0):
+            token.check()
+        try:
+            st = os.stat(source)
+        except OSError:
+            continue
+        if not(os.path.isfile(source)):
+            continue
+        nameLength = len(arcname.encode("utf-8"))
+        headersSize += zipfile.sizeFileHeader+zipfile.sizeCentralDir+nameLength*2
+        groups.setdefault((os.path.splitext(source)[1].lower(), st.st_size.bit_length()//4), []).append((source, st.st_size))
+        inputBytes += st.st_size
+        count += 1
+    groups = sorted(groups.values(), key=lambda files: -sum(size for source, size in files))
+    blocksLeft = estimateMaxBlocks
+    totalIn = totalOut = totalSeconds = 0
+    outputSize = cpuSeconds = longestMember = 0
+    unsampled = []
+    for files in groups:
+        groupBytes = sum(size for source, size in files)
+        groupBlocks = min(blocksLeft, max(1, round(estimateMaxBlocks*groupBytes/max(inputBytes, 1))))
+        if(groupBlocks == 0):
+            unsampled.append(files)
+            continue
+        samples = min(len(files), max(1, groupBlocks//getSampleBlocks(groupBytes//len(files))))
+        groupIn = groupOut = groupSeconds = 0
+        for k in range(samples):
+            if(token):
+                token.check()
+            source, size = files[k*len(files)//samples]
+            blocks = max(1, min(getSampleBlocks(size), groupBlocks))
+            groupBlocks -= blocks
+            blocksLeft -= blocks
+            try:
+                sampleIn, sampleOut, seconds = sampleCompression(source, size, compress_type, level, autoStore, blocks)
+            except OSError:
+                continue
+            groupIn += sampleIn
+            groupOut += sampleOut
+            groupSeconds += seconds
+        if(groupIn == 0):
+            unsampled.append(files)
+            continue
+        totalIn += groupIn
+        totalOut += groupOut
+        totalSeconds += groupSeconds
+        outputSize += groupBytes*groupOut/groupIn
+        cpuSeconds += groupBytes*groupSeconds/groupIn
+        longestMember = max(longestMember, max(size for source, size in files)*groupSeconds/groupIn)
+    for files in unsampled:
+        groupBytes = sum(size for source, size in files)
+        outputSize += groupBytes*(totalOut/totalIn if totalIn > 0 else 1)
+        cpuSeconds += groupBytes*(totalSeconds/totalIn if totalIn > 0 else 0)
+    threads = getThreadCount(threads)
+    if(compress_type == zipfile.ZIP_DEFLATED and (blockThreshold > 0 or algorithm == parallelDeflateAlgorithm)):
+        longestMember /= threads # Big members are split in blocks that are compressed in parallel
+    return CompressionEstimate(int(outputSize)+headersSize, max(cpuSeconds/threads, longestMember), inputBytes, count, totalIn)
+
+
+def compress(zipPath: str, sources: list, algorithm: str = "Deflated", level: int = 5, threads: int = 0, blockThreshold: int = 64*1000000, onMembersStarted=None, onMembersDone=None, onMemberFailed=None, token: CancellationToken = None, update: bool = False, verifyCrc: bool = False, cache: BlobCache = None, budget: CompressionBudget = None) -> Job:
+    # sources are (path, name on the zip) tuples, or paths that are added like collectMembers does.
+    # The callbacks get indexes on the final list of members and are called from the worker threads.
+    # With update, members of an existing zipPath whose size and modification time (and CRC, with
+    # verifyCrc) still match their source are copied from it as they are, and only the rest is compressed.
+    # With a cache, members compressed by an earlier job with the same method and level are reused.
+    # The "Auto" algorithms store the members that are already compressed and compress the rest.
+    # With a budget, level is the highest level used, and it is lowered when the job runs out of time.
+    def run(job: Job) -> list:
+        if(budget != None):
+            budget.start()
+        members = []
+        for source in sources:
+            if(isinstance(source, str)):
+                members += [member for member in collectMembers([source], job.token) if os.path.abspath(member[0]) != os.path.abspath(zipPath)]
+            else:
+                members.append(source)
+        job.total = len(members)
+        job.totalBytes = getSourcesSize(members, job.token)
+
+        def membersDone(indexes: list) -> None:
+            job.addDone(len(indexes), members[indexes[-1]][0])
+            if(onMembersDone):
+                onMembersDone(indexes)
+
+        def memberFailed(index: int, e: Exception) -> None:
+            job.addError(members[index][0], e)
+            job.addDone(1)
+            if(onMemberFailed):
+                onMemberFailed(index, e)
+
+        compress_type = getCompressionType(algorithm)
+        threshold = deflateBlockSize if algorithm == parallelDeflateAlgorithm else blockThreshold
+        oldZip = None
+        if(update and os.path.isfile(zipPath) and os.path.getsize(zipPath) > 0):
+            try:
+                oldZip = zipfile.ZipFile(zipPath)
+            except zipfile.BadZipFile as e:
+                log(f"[  WARN  ] Unable to read {zipPath} to update it, every file will be compressed ({e})")
+        targetPath = zipPath
+        if(oldZip != None):
+            # The new zip is written next to the old one, which is replaced once it is complete
+            fd, targetPath = tempfile.mkstemp(prefix=".", suffix=".zip.tmp", dir=os.path.dirname(os.path.abspath(zipPath)))
+            os.close(fd)
+        finished = False
+        zipFile = None
+        try:
+            zipFile = WriteBehindFile(targetPath, "wb")
+            zipObj = zipfile.ZipFile(zipFile, "w")
+            compressor = ParallelCompressor(zipObj, compress_type, level, threads, threshold, cache, algorithm in autoAlgorithms, budget)
+            try:
+                if(oldZip == None):
+                    finished = compressor.compress(members, onMembersStarted, membersDone, memberFailed, job.token, job.counter.add)
+                else:
+                    changed = []
+                    seek = True
+                    for index, (source, arcname) in enumerate(members):
+                        # Same name ZipInfo.from_file() would give
+                        name = os.path.normpath(os.path.splitdrive(arcname)[1]).lstrip(os.sep+(os.altsep or "")).replace(os.sep, "/")
+                        zinfo = oldZip.NameToInfo.get(name)
+                        if(zinfo != None and isMemberUnchanged(zinfo, source, compress_type, verifyCrc, job.token, algorithm in autoAlgorithms)):
+                            copyRawMember(zipObj, oldZip.fp, zinfo, job.token, seek)
+                            seek = False
+                            job.counter.add(zinfo.file_size)
+                            job.addStat("reused_members")
+                            job.addStat("reused_bytes", zinfo.file_size)
+                            membersDone([index])
+                        else:
+                            changed.append(index)
+                    log(f"[  INFO  ] {job.stats['reused_members']} members of {zipPath} are unchanged, {len(changed)} will be compressed")
+
+                    def changedStarted(indexes: list) -> None:
+                        if(onMembersStarted):
+                            onMembersStarted([changed[i] for i in indexes])
+
+                    finished = compressor.compress([members[i] for i in changed], changedStarted, lambda indexes: membersDone([changed[i] for i in indexes]), lambda index, e: memberFailed(changed[index], e), job.token, job.counter.add)
+            except OperationCancelled:
+                finished = False
+            finally:
+                try:
+                    zipObj.close()
+                finally:
+                    zipFile.close()
+        except BaseException:
+            # A zip that was not completely written is useless. When updating, the old one is kept as it was
+            if(targetPath != zipPath or zipFile != None):
+                try:
+                    os.remove(targetPath)
+                except OSError:
+                    log(f"[  WARN  ] Unable to remove {targetPath}")
+            raise
+        finally:
+            if(oldZip != None):
+                oldZip.close()
+        if not(finished):
+            try:
+                os.remove(targetPath)
+            except OSError:
+                log("[  WARN  ] Unable to remove zip file")
+            raise OperationCancelled()
+        if(targetPath != zipPath):
+            os.replace(targetPath, zipPath)
+        if(compressor.autoStore):
+            job.addStat("auto_stored_members", compressor.autoStoredMembers)
+            job.addStat("auto_stored_bytes", compressor.autoStoredBytes)
+            job.addStat("auto_saved_seconds", round(compressor.getSavedSeconds(), 1))
+            log(f"[  INFO  ] Stored {compressor.autoStoredMembers} already compressed members ({compressor.autoStoredBytes/1000000:.2f} MB), saving about {compressor.getSavedSeconds():.1f} s of compression")
+        if(cache != None):
+            job.addStat("cache_hits", compressor.cacheHits)
+            job.addStat("cache_misses", compressor.cacheMisses)
+            log(f"[  INFO  ] Compression cache: {compressor.cacheHits} hits and {compressor.cacheMisses} misses")
+        if(budget != None):
+            job.addStat("level_changes", budget.levelChanges)
+            for usedLevel, size in budget.levelBytes.items():
+                job.addStat(f"level_{usedLevel}_bytes", size)
+            log(f"[  INFO  ] Compression levels used: {budget.getSummary()} ({budget.levelChanges} changes)")
+            if not(budget.isMet()):
+                job.addStat("budget_missed")
+                log("[  WARN  ] The compression budget was not met")
+        log(f"[  INFO  ] Compressed {job.counter.value/1000000:.2f} MB at {job.counter.getThroughput()/1000000:.2f} MB/s")
+        return job.errors
+
+    return Job(token).start(run)
+
+def extract(zipPath: str, directory: str, names: list = None, indexes: list = None, threads: int = 0, onMembersDone=None, token: CancellationToken = None, archiveIndex: ArchiveIndex = None, selection: Bitset = None) -> Job:
+    # With an archiveIndex and a selection snapshot of it, the selected members are looked up by the job, not by the caller
+    def run(job: Job) -> list:
+        nonlocal indexes
+        if(archiveIndex != None and selection != None):
+            indexes = archiveIndex.getSelectedMembers(selection)
+        job.total, job.totalBytes = getMembersSize(zipPath, names, indexes)
+
+        def membersDone(done: list) -> None:
+            job.addDone(len(done), done[-1])
+            if(onMembersDone):
+                onMembersDone(done)
+
+        errors = ParallelExtractor(zipPath, directory, threads).extract(names, membersDone, job.token, job.counter.add, indexes)
+        for name, e in errors:
+            job.addError(name, e)
+        log(f"[  INFO  ] Extracted {job.counter.value/1000000:.2f} MB at {job.counter.getThroughput()/1000000:.2f} MB/s")
+        return errors
+
+    return Job(token).start(run)
+
+def test(zipPath: str, names: list = None, indexes: list = None, threads: int = 0, onMembersDone=None, token: CancellationToken = None) -> Job:
+    def run(job: Job) -> list:
+        job.total, job.totalBytes = getMembersSize(zipPath, names, indexes)
+
+        def membersDone(done: list) -> None:
+            job.addDone(len(done), done[-1])
+            if(onMembersDone):
+                onMembersDone(done)
+
+        errors = ParallelExtractor(zipPath, "", threads).test(names, membersDone, job.token, job.counter.add, indexes)
+        for name, e in errors:
+            job.addError(name, e)
+        log(f"[  INFO  ] Tested {job.counter.value/1000000:.2f} MB at {job.counter.getThroughput()/1000000:.2f} MB/s")
+        return errors
+
+    return Job(token).start(run)
@@ -1,47 +1,39 @@
 
 from PySide2 import QtWidgets, QtGui, QtCore
-from CustomWidgets import TreeWidget, ProgressUpdater, KillableThread, ComboBoxAction, SpinBoxAction, CheckBoxAction
-from functools import partial
+from CustomWidgets import TreeView, ArchiveModel, JobWatcher, ProgressUpdater, CheckBoxAction
 from Tools import *
 #from Tools import log, debugging, _platform, getFileIcon, getPath, openOnExplorer, notify, settings, tempDir
-import os, zipfile, time, sys
+import os, zipfile
 from sys import platform as _platform
 from threading import Thread
-import subprocess
-from qt_thread_updater import get_updater
+import Engine
 
 
 class Extractor(QtWidgets.QWidget):
     throwInfoSignal = QtCore.Signal(str, str)
     throwWarningSignal = QtCore.Signal(str, str)
     throwErrorSignal = QtCore.Signal(str, str)
-    
-    updateProgressBar = QtCore.Signal([int, int], [int, int, str])
-    
-    changeItemIcon = QtCore.Signal(QtWidgets.QTreeWidgetItem, int, str)
-    changeItemText = QtCore.Signal(QtWidgets.QTreeWidgetItem, int, str)
-
-    stopLoadingSignal = QtCore.Signal()
+    archiveLoadedSignal = QtCore.Signal(int, str, object)
 
 
     def __init__(self, parent=None, startFile: str = ""):
         super().__init__(parent=parent)
         self.window = parent
         self.isExtracting = False
+        self.isTesting = False
         self.errorWhileCompressing = None
         self.compression_level = 5
         self.files = []
         self.zip = ""
+        self.model = None
+        self.loadGeneration = 0
+        self.cancelToken = Engine.CancellationToken()
         self.setUpToolBar()
         self.setUpWidgets()
         self.throwInfoSignal.connect(self.throwInfo)
         self.throwWarningSignal.connect(self.throwWarning)
         self.throwErrorSignal.connect(self.throwError)
-
-        self.updateProgressBar[int, int].connect(self.updateProgressBarValue)
-        self.updateProgressBar[int, int, str].connect(self.updateProgressBarValue)
-
-        self.stopLoadingSignal.connect(self.stopLoading)
+        self.archiveLoadedSignal.connect(self.showArchive)
 
         if(startFile != ""):
             self.openZip(startFile)
@@ -84,11 +76,25 @@ class Extractor(QtWidgets.QWidget):
 
         self.toolBar.addSeparator()
 
+        self.selectAllAction = QtWidgets.QAction("Extract all files", self)
+        self.selectAllAction.setToolTip("Mark every file to be extracted")
+        self.selectAllAction.triggered.connect(lambda: self.selectAll(True))
+
+        self.selectNoneAction = QtWidgets.QAction("Skip all files", self)
+        self.selectNoneAction.setToolTip("Mark every file to be skipped")
+        self.selectNoneAction.triggered.connect(lambda: self.selectAll(False))
+
         self.openFilesAction = QtWidgets.QAction("Open with default application", self)
         self.openFilesAction.setToolTip("Open with default application")
         self.openFilesAction.setIcon(QtGui.QIcon(getPath("window.ico")))
         self.openFilesAction.triggered.connect(self.openItemFile)
         self.toolBar.addAction(self.openFilesAction)
+
+        self.testAction = QtWidgets.QAction("Test archive", self)
+        self.testAction.setToolTip("Check the integrity of every file on the zip without extracting it")
+        self.testAction.setIcon(QtGui.QIcon(getPath("zip_ok.ico")))
+        self.testAction.triggered.connect(lambda: self.startLoading(test=True))
+        self.toolBar.addAction(self.testAction)
         
         self.toolBar.addSeparator()
 
@@ -102,16 +108,12 @@ class Extractor(QtWidgets.QWidget):
 
         log("[        ] Now loading widgets...")
 
-        self.treeWidget = TreeWidget(self)
-        self.treeWidget.setSortingEnabled(True)
-        self.treeWidget.setEmptyText("Select a zip file to start")
-        self.treeWidget.connectFileDragEvent(self.openZip)
-        self.treeWidget.setHeaderLabels(["Name", "Size", "Extract or skip"])
-        self.treeWidget.setColumnHidden(3, True)
-        self.treeWidget.setColumnHidden(4, True)
-        self.treeWidget.itemDoubleClicked.connect(self.openItemFile)
-        self.treeWidget.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)  
-        self.treeWidget.customContextMenuRequested.connect(self.showRightClickMenu)
+        self.treeView = TreeView(self)
+        self.treeView.setEmptyText("Select a zip file to start")
+        self.treeView.connectFileDragEvent(self.openZip)
+        self.treeView.doubleClicked.connect(self.openItemFile)
+        self.treeView.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)  
+        self.treeView.customContextMenuRequested.connect(self.showRightClickMenu)
 
         self.magicButton = QtWidgets.QPushButton(self)
         self.magicButton.setFixedHeight(25)
@@ -149,6 +151,10 @@ class Extractor(QtWidgets.QWidget):
         self.zipRealSize.setFocusPolicy(QtCore.Qt.NoFocus)
         self.infoLayout.addRow("Real size:", self.zipRealSize)
         
+        self.zipFiles = QtWidgets.QLineEdit()
+        self.zipFiles.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.infoLayout.addRow("Contents:", self.zipFiles)
+
         self.zipRate = QtWidgets.QLineEdit()
         self.zipRate.setFocusPolicy(QtCore.Qt.NoFocus)
         self.infoLayout.addRow("Compression rate:", self.zipRate)
@@ -162,7 +168,7 @@ class Extractor(QtWidgets.QWidget):
 
         verLayout1.addWidget(self.zipFileInfo)
         verLayout1.addWidget(self.magicButton)
-        verLayout2.addWidget(self.treeWidget)
+        verLayout2.addWidget(self.treeView)
         verLayout2.addWidget(self.currentStatusBar)
 
         self.horLayout1.addLayout(verLayout1)
@@ -180,23 +186,33 @@ class Extractor(QtWidgets.QWidget):
         else:
             self.stopLoading()
     
-    def startLoading(self) -> None:
-        self.magicButton.setText("Cancel extraction")
+    def startLoading(self, test: bool = False) -> None:
+        if(self.isExtracting):
+            return
+        operation = "test" if test else "extraction"
+        self.magicButton.setText(f"Cancel {operation}")
         self.isExtracting = True
-        self.treeWidget.expandAll()
+        self.isTesting = test
         self.currentStatusBar.startLoading()
         self.addFileAction.setEnabled(False)
+        self.testAction.setEnabled(False)
         self.subdircheck.setEnabled(False)
-        self.magicAction.setText("Cancel Extraction")
-        self.magicAction.setToolTip("Cancel Extraction")
+        self.magicAction.setText(f"Cancel {operation.capitalize()}")
+        self.magicAction.setToolTip(f"Cancel {operation.capitalize()}")
         self.magicAction.setIcon(QtGui.QIcon(getPath("cancelCompress.ico")))
-        self.extractZip()
+        if(test):
+            self.testZip()
+        else:
+            self.extractZip()
     
     def stopLoading(self) -> None:
         self.magicButton.setText("Extract")
         self.isExtracting = False
-        self.treeWidget.setEnabled(True)
+        self.isTesting = False
+        self.cancelToken.cancel()
+        self.treeView.setEnabled(True)
         self.addFileAction.setEnabled(True)
+        self.testAction.setEnabled(True)
         self.subdircheck.setEnabled(True)
         self.magicAction.setText("Extract")
         self.magicAction.setToolTip("Extract")
@@ -204,41 +220,26 @@ class Extractor(QtWidgets.QWidget):
         self.currentStatusBar.stopLoading()
     
     def openItemFile(self) -> None:
-        item = self.treeWidget.currentItem()
-        if(item.text(1)!=""):
+        index = self.treeView.currentIndex()
+        if(index.isValid() and not(self.model.archiveIndex.isFolder(index.internalId()))):
             log("[        ] Opening file with default app...")
             archive = zipfile.ZipFile(self.zip)
-            print(archive.namelist())
-            self.openOSFileDirectly(archive.extract(item.text(5), tempDir.name))
+            self.openOSFileDirectly(archive.extract(self.model.archiveIndex.getMemberName(index.internalId()), tempDir.name))
             archive.close()
     
-    def updateProgressBarValue(self, actual: int, total: int, actualFile=""):
-        if(actualFile!=""):
-            try:
-                size = os.path.getsize(actualFile)
-                size = size/1000
-                if(size<1000):
-                    fsize = f"{size:.2f} KB"
-                else:
-                    fsize = f"{size/1000:.2f} MB"
-
-            except FileNotFoundError:
-                fsize = "0 B"
-            self.currentStatusBar.infoLabel.setText(f"Extracting file \"{actualFile}\" ({fsize}, {actual} out of {total})")
-        else:
-            self.currentStatusBar.infoLabel.setText("Extracting...")
-        self.currentStatusBar.setRange(0, total)
-        self.currentStatusBar.setValue(actual)
+    def selectAll(self, checked: bool) -> None:
+        if(self.model):
+            self.model.setChecked(0, checked)
 
     def showRightClickMenu(self, pos: QtCore.QPoint) -> None:
         x = 0
         x = 0
-        x += self.treeWidget.pos().x()
+        x += self.treeView.pos().x()
         x += self.window.pos().x()
         x += pos.x()
         y = 0
         y += 90 # Tab widget + menubar
-        y += self.treeWidget.pos().y()
+        y += self.treeView.pos().y()
         y += self.window.pos().y()
         y += pos.y()
         log(f"[        ] Showing menu at {x}x{y}")
@@ -249,7 +250,13 @@ class Extractor(QtWidgets.QWidget):
         
         menu.addSeparator()
 
+        menu.addAction(self.selectAllAction)
+        menu.addAction(self.selectNoneAction)
+
+        menu.addSeparator()
+
         menu.addAction(self.openFilesAction)
+        menu.addAction(self.testAction)
 
         menu.addSeparator()
 
@@ -295,131 +302,24 @@ class Extractor(QtWidgets.QWidget):
                 self.throwError("Error", f"The file {supposedZip} is not a valid zip file!")
                 return
             else:
-                self.treeWidget.clear()
                 zip = supposedZip.replace("\\", "/")
-                self.zip = zip
-                zipFile = zipfile.ZipFile(zip)
-
-                size = 0
-                compSize = 0
-
-                deflate, lzma, bzip2, stored = False, False, False, False
-
-                for element in zipFile.infolist():
-                    compSize += element.compress_size
-                    size += element.file_size
-                    if not(deflate):
-                        if(element.compress_type == zipfile.ZIP_DEFLATED):
-                            deflate = True
-                    if not(lzma):
-                        if(element.compress_type == zipfile.ZIP_LZMA):
-                            lzma = True
-                    if not(bzip2):
-                        if(element.compress_type == zipfile.ZIP_BZIP2):
-                            bzip2 = True
-                    if not(stored):
-                        if(element.compress_type == zipfile.ZIP_STORED):
-                            stored = True
-
-                zipAlgorithms = ""
-                if(deflate):
-                    zipAlgorithms += "Deflated; "
-                if(lzma):
-                    zipAlgorithms += "LZMA; "
-                if(bzip2):
-                    zipAlgorithms += "BZIP2; "
-                if(stored):
-                    zipAlgorithms += "Stored; "
-
-                self.zipName.setText(zip.split("/")[-1])
-                self.zipPath.setText('/'.join(zip.split("/")[:-1]))
-                self.zipSize.setText(f"{compSize/1000000:.2f} MB")
-                self.zipRealSize.setText(f"{size/1000000:.2f} MB")
-                self.zipRate.setText(f"{compSize/size*100:.1f} %")
-                self.zipAlgorithm.setText(zipAlgorithms)
-
-                files = []
-                folders = {}
-                infos = []
-
-                for file in zipFile.namelist():
-                    if(file[-1] == "/"):
-                        pass
-                    else:
-                        files.append(file.split('/'))
-                        infos.append(zipFile.getinfo(file))
-                
-                infoindex = 0
-                itemsToProcess = []
-                for file in files:
+                self.loadGeneration += 1
+                log(f'[        ] Loading the listing of {zip}')
+
+                def loadArchive(generation: int, zip: str) -> None:
                     try:
-                        info = infos[infoindex]
-                        i = 0
-                        parentWidgets = []
-                        while i<len(file):
-                            path = file[i]
-                            try:
-                                parentWidgets.append(folders[path])
-                                i += 1
-                            except KeyError:
-                                log(f"[        ] Adding item {path}")
-                                item =  QtWidgets.QTreeWidgetItem()
-                                item.setText(0, path)
-                                item.setText(5, info.filename) 
-                                if(i+1<len(file)):
-                                    item.setText(1, "")
-                                    try:
-                                        item.setIcon(0, QtGui.QIcon(QtGui.QPixmap(getPath("folder.ico")).scaledToWidth(24, QtCore.Qt.SmoothTransformation)))
-                                        item.setText(6, "folder")
-                                    except:
-                                        pass
-                                else:
-                                    item.setText(1, f"{info.file_size/1000000:.3f} MB")
-                                    try:
-                                        item.setIcon(0, QtGui.QIcon(getFileIcon(path)))
-                                        item.setText(6, "file")
-                                    except:
-                                        pass
-                                folders[path] = item
-                                itemsToProcess.append(item)
-                            
-
-                        i = 0
-                        while i<(len(parentWidgets)-1):
-                            parentWidgets[i].addChild(parentWidgets[i+1])
-                            i += 1
-
-                        
-                    except Exception as e:
-                        self.throwError("SomePythonThings Zip Manager", f"Unable to load file {file}\n\nError Details:\n{str(e)}")
-                        if(debugging):
-                            raise e
-                    infoindex += 1
-
-                for folder in folders.values():
-                    self.treeWidget.addTopLevelItem(folder)
-                self.treeWidget.expandAll()
-                print(itemsToProcess)
-                for item in itemsToProcess:
-                    def changeState(checkbox: QtWidgets.QCheckBox, item: QtWidgets.QTreeWidgetItem, _):
-                        item.setDisabled(not(checkbox.isChecked()))
-                        if(checkbox.isChecked()):
-                            checkbox.setText("Extract")
+                        archiveIndex = listingCache.load(zip)
+                        if(archiveIndex != None):
+                            self.archiveLoadedSignal.emit(generation, zip, archiveIndex)
                         else:
-                            checkbox.setText("Skip")
-                        for i in range(item.childCount()):
-                            subitem = item.child(i)
-                            subcheckbox = subitem.treeWidget().itemWidget(subitem, 2)
-                            if(subcheckbox):
-                                subitem.setDisabled(not(subcheckbox.isChecked()))
-                                subcheckbox.setChecked(checkbox.isChecked())
-                            else:
-                                log("[  WARN  ] Unable to disable/enable other checkboxes")
-                    checkbox = QtWidgets.QCheckBox()
-                    checkbox.setChecked(True)
-                    checkbox.setText("Extract")
-                    checkbox.stateChanged.connect(partial(changeState, (checkbox), (item)))
-                    item.treeWidget().setItemWidget(item, 2, checkbox)
+                            archiveIndex = Engine.readArchiveIndex(zip)
+                            self.archiveLoadedSignal.emit(generation, zip, archiveIndex)
+                            listingCache.store(zip, archiveIndex)
+                    except Exception as e:
+                        log(f"[ FAILED ] Unable to read the listing of {zip}: {e}")
+                        self.throwErrorSignal.emit("SomePythonThings Zip Manager", "Unable to select zip file.\n\nReason:\n"+str(e))
+
+                Thread(target=loadArchive, args=(self.loadGeneration, zip), daemon=True).start()
         except Exception as e:
             self.throwError("SomePythonThings Zip Manager", "Unable to select zip file.\n\nReason:\n"+str(e))
             if(debugging):
@@ -427,6 +327,42 @@ class Extractor(QtWidgets.QWidget):
 
 
 
+    def showArchive(self, generation: int, zip: str, archiveIndex: Engine.ArchiveIndex) -> None:
+        if(generation != self.loadGeneration):
+            return
+        self.zip = zip
+        size = archiveIndex.sizes[0]
+        compSize = archiveIndex.compressedSizes[0]
+        deflate = zipfile.ZIP_DEFLATED in archiveIndex.compressTypes
+        lzma = zipfile.ZIP_LZMA in archiveIndex.compressTypes
+        bzip2 = zipfile.ZIP_BZIP2 in archiveIndex.compressTypes
+        stored = zipfile.ZIP_STORED in archiveIndex.compressTypes
+
+        zipAlgorithms = ""
+        if(deflate):
+            zipAlgorithms += "Deflated; "
+        if(lzma):
+            zipAlgorithms += "LZMA; "
+        if(bzip2):
+            zipAlgorithms += "BZIP2; "
+        if(stored):
+            zipAlgorithms += "Stored; "
+
+        self.zipName.setText(zip.split("/")[-1])
+        self.zipPath.setText('/'.join(zip.split("/")[:-1]))
+        self.zipSize.setText(f"{compSize/1000000:.2f} MB")
+        self.zipRealSize.setText(f"{size/1000000:.2f} MB")
+        self.zipRate.setText(f"{compSize/size*100:.1f} %" if size > 0 else "0.0 %")
+        self.zipAlgorithm.setText(zipAlgorithms)
+        self.zipFiles.setText(f"{archiveIndex.fileCounts[0]} files")
+
+        if(self.model):
+            self.model.deleteLater()
+        self.model = ArchiveModel(archiveIndex, self)
+        self.treeView.setModel(self.model)
+        self.treeView.setColumnWidth(0, 300)
+        log(f'[   OK   ] Listing of {zip} loaded')
+
     def extractZip(self):
         zip = self.zip
         if(self.zip == ''):
@@ -450,19 +386,10 @@ class Extractor(QtWidgets.QWidget):
                         directory += "/"+zip.split('/')[-1]+" - Extracted files"
                     log("[  INFO  ] Zip file will be extracted into "+directory)
 
-                    def analyzeFileList(files: list, item: QtWidgets.QTreeWidgetItem):
-                            if(item.childCount()>0):
-                                for i in range(item.childCount()):
-                                    files = analyzeFileList(files, item.child(i))
-                            else:
-                                files.append(item)
-                            return files
-
-                    files = []
-                    for i in range(self.treeWidget.topLevelItemCount()):
-                        files = analyzeFileList(files, self.treeWidget.topLevelItem(i))
-
-                    Thread(target=self.heavyExtract, args=(directory, zip, files), daemon=True).start()
+                    self.cancelToken = Engine.CancellationToken()
+                    log('[        ] Extracting zip file on '+str(directory))
+                    job = Engine.extract(zip, directory, threads=settings["extraction_threads"], token=self.cancelToken, archiveIndex=self.model.archiveIndex, selection=self.model.getSelectionSnapshot())
+                    self.watchJob(job, lambda job: self.extractionFinished(job, directory))
             except Exception as e:
                 if debugging:
                     raise e
@@ -471,72 +398,82 @@ class Extractor(QtWidgets.QWidget):
 
 
 
-    def pure_extract(self, zipObj, file, directory, passwd=""):
-        self.errorWhileExtracting = None
-        try:
-            zipObj.extract(file, directory)
-        except Exception as e:
-            self.errorWhileExtracting = e
+    def watchJob(self, job: Engine.Job, onFinished) -> None:
+        watcher = JobWatcher(job, self)
+        watcher.progressChanged.connect(lambda progress: self.currentStatusBar.setProgress(progress, "Testing" if self.isTesting else "Extracting"))
+        watcher.finished.connect(onFinished)
 
-    def heavyExtract(self, directory, zip, files):
+    def extractionFinished(self, job: Engine.Job, directory: str):
         try:
-            error = False
-            log('[        ] Extracting zip file on '+str(directory))
-            archive = zipfile.ZipFile(zip)
-            totalFiles = 0
-            for file in archive.namelist():
-                totalFiles += 1
-            actualFile = 0
-            self.errorWhileExtracting = None
-            #if(password!=""):
-            #    archive.setpassword(bytes(password, 'utf-8'))
-            for file in files:
-        
-                if(file.treeWidget().itemWidget(file, 2).isChecked()):
-                    file = file.text(5)
-                    try:
-                        self.updateProgressBar[int, int, str].emit(actualFile, totalFiles, file)
-                        t = KillableThread(target=self.pure_extract, args=( archive, file, directory))
-                        t.start()
-                        while t.is_alive():
-                            if not(self.isExtracting):
-                                log("[  WARN  ] User canceled the zip extraction!")
-                                self.stopLoadingSignal.emit()
-                                t.shouldBeRuning=False
-                                self.throwWarningSignal.emit("SomePythonThings Zip Manager", "User cancelled the zip extraction")
-                                archive.close()
-                                sys.exit("User killed zip creation process")
-                            else:
-                                time.sleep(0.01)
-                        t.join()
-                        if(self.errorWhileExtracting!=None):
-                            raise self.errorWhileExtracting
-                        log('[   OK   ] File '+file.split('/')[-1]+' extracted successfully')
-                    except Exception as e:
-                        log('[  WARN  ] Unable to extract file ' +file.split('/')[-1])
-                        self.throwWarningSignal.emit("SomePythonThings Zip Manager", 'Unable to extract file '+file.split('/')[-1]+"\n\nReason:\n"+str(e))
-                        error = True
-                    finally:
-                        actualFile += 1
-                else:
-                    log(f"[   OK   ] Skipping file {file.text(0)}")
-            self.updateProgressBar[int, int].emit(totalFiles, totalFiles)
+            try:
+                errors = job.result()
+            except Engine.OperationCancelled:
+                log("[  WARN  ] User canceled the zip extraction!")
+                self.stopLoading()
+                self.throwWarning("SomePythonThings Zip Manager", "User cancelled the zip extraction")
+                return
+            totalFiles = job.total
             notify("Extraction Done!", "SomePythonThings Zip Manager has finished extracting the selected files and folders.", self.window)
-            self.stopLoadingSignal.emit()
-            if error:
-                log('[  WARN  ] Zip file extracted with some errors')
-                self.throwWarningSignal.emit("SomePythonThings Zip Manager", 'Zip file extracted with some errors')
+            self.stopLoading()
+            if(len(errors) > 0):
+                log(f'[  WARN  ] Zip file extracted with {len(errors)} errors')
+                details = ""
+                for name, e in errors[:10]:
+                    details += f" - {name.split('/')[-1]}: {e}\n"
+                if(len(errors) > 10):
+                    details += f" - ...and {len(errors)-10} more (see the log for details)\n"
+                self.throwWarning("SomePythonThings Zip Manager", f'Zip file extracted with some errors. Unable to extract {len(errors)} out of {totalFiles} files:\n\n'+details)
             else:
                 log('[   OK   ] Zip file extracted sucessfully')
-                self.throwInfoSignal.emit("SomePythonThings Zip Manager", 'Zip file extracted sucessfully')
+                self.throwInfo("SomePythonThings Zip Manager", 'Zip file extracted sucessfully')
             openOnExplorer(directory, force=True)
         except Exception as e:
             if debugging:
                 raise e
-            self.stopLoadingSignal.emit()
+            self.stopLoading()
             log('[ FAILED ] Error occurred while extracting zip File')
-            self.throwErrorSignal.emit("SomePythonThings Zip Manager", 'Unable to extract the zip\n\nReason:\n'+str(e))
+            self.throwError("SomePythonThings Zip Manager", 'Unable to extract the zip\n\nReason:\n'+str(e))
+
+    def testZip(self):
+        if(self.zip == ''):
+            self.window.throwWarning("SomePythonThings Zip Manager", "Please select one zip file to test it.")
+            self.stopLoading()
+        else:
+            self.cancelToken = Engine.CancellationToken()
+            log('[        ] Testing zip file '+str(self.zip))
+            job = Engine.test(self.zip, threads=settings["extraction_threads"], token=self.cancelToken)
+            self.watchJob(job, self.testFinished)
 
+    def testFinished(self, job: Engine.Job):
+        try:
+            try:
+                errors = job.result()
+            except Engine.OperationCancelled:
+                log("[  WARN  ] User canceled the zip test!")
+                self.stopLoading()
+                self.throwWarning("SomePythonThings Zip Manager", "User cancelled the zip test")
+                return
+            totalFiles = job.total
+            progress = job.getProgress()
+            summary = f"{totalFiles} files ({progress.bytes/1000000:.2f} MB) tested at {progress.averageSpeed/1000000:.2f} MB/s"
+            self.stopLoading()
+            if(len(errors) > 0):
+                log(f'[  WARN  ] Zip file has {len(errors)} corrupt files')
+                details = ""
+                for name, e in errors[:10]:
+                    details += f" - {name}: {e}\n"
+                if(len(errors) > 10):
+                    details += f" - ...and {len(errors)-10} more (see the log for details)\n"
+                self.throwWarning("SomePythonThings Zip Manager", f'{len(errors)} out of {totalFiles} files are corrupt:\n\n'+details+f'\n{summary}')
+            else:
+                log('[   OK   ] Zip file tested sucessfully')
+                self.throwInfo("SomePythonThings Zip Manager", f'No errors found on the zip file.\n\n{summary}')
+        except Exception as e:
+            if debugging:
+                raise e
+            self.stopLoading()
+            log('[ FAILED ] Error occurred while testing zip File')
+            self.throwError("SomePythonThings Zip Manager", 'Unable to test the zip\n\nReason:\n'+str(e))
 
 
 if(__name__=="__main__"):
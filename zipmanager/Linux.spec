@@ -10,7 +10,7 @@ package_imports = [['qtmodern', ['resources/frameless.qss', 'resources/style.qss
 
 a = Analysis(['__init__.py'],
              pathex=['/mnt/c/Users/marti/SPTPrograms/SomePythonThings-Zip-Manager/zipmanager'],
-             binaries=[('Compressor.py', '.'), ('Extractor.py', '.'), ('CustomWidgets.py', '.'), ('MainWindow.py', '.'), ('Tools.py', '.'), ('Updater.py', '.'), ('Welcome.py', '.')],
+             binaries=[('Compressor.py', '.'), ('Extractor.py', '.'), ('CustomWidgets.py', '.'), ('MainWindow.py', '.'), ('Tools.py', '.'), ('Updater.py', '.'), ('Welcome.py', '.'), ('Engine.py', '.'), ('Cli.py', '.')],
              datas=[('res', 'res')],
              hiddenimports=['pkg_resources.py2_warn', ".Tools.*", "json", "darkdetect", "qtmodern", "qt_thread_updater", "wget", "PySide2.*", "zipfile", "threading", "PySide2"],
              hookspath=[],
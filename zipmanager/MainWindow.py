@@ -1,13 +1,9 @@
 from PySide2 import QtWidgets, QtGui, QtCore
 from Tools import *
 #from Tools import log, openLog, openHelp, openSettingsWindow, getPath, CheckModeThread, baseStyleSheet, settings, version, realpath
-import darkdetect, qtmodern.styles, sys, os
-import qtmodern.styles
+import darkdetect, sys, os
 from sys import platform as _platform
-from Compressor import Compressor
-from Extractor import Extractor
 from Welcome import Welcome
-from Updater import checkForUpdates
 
 
 class Window(QtWidgets.QMainWindow):
@@ -28,11 +24,10 @@ class Window(QtWidgets.QMainWindow):
         self.version = version
         self.setWindowIcon(QtGui.QIcon(getPath("zip.ico")))
         self.menuBarAlreadyCreated = False
+        self.backgroundWorkStarted = False
 
         self.themeThread = CheckModeThread()
-        self.themeThread.start()
         self.themeThread.refreshTheme.connect(self.loadStyleSheet)
-        self.themeThread
 
         self.setWindowTitle("SomePythonThings Zip Manager")
         self.loadStyleSheet()
@@ -43,9 +38,8 @@ class Window(QtWidgets.QMainWindow):
         self.loadMenuBar()
         self.loadWidgets()
         self.installEventFilter(self)
+        QtCore.QTimer.singleShot(2000, self.startBackgroundWork) # In case the window never gets painted
         log("[   OK   ] Window loaded successfully")
-        log("[        ] Calling updates thread...")
-        checkForUpdates(self)
 
         if(_platform == "win32"):
                     from PySide2 import QtWinExtras
@@ -56,18 +50,29 @@ class Window(QtWidgets.QMainWindow):
                     self.taskbprogress.setValue(0)
                     self.taskbprogress.hide()
 
-    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
-        self.themeThread.shouldBeRunning = False
-        self.themeThread.quit()
-        self.themeThread.wait()
-        import time
-        time.sleep(1)
-        return event.accept()
-        
-        
+    def startBackgroundWork(self) -> None:
+        # Theme watching, the banner download and the update check wait until the window has been painted
+        if(self.backgroundWorkStarted):
+            return
+        self.backgroundWorkStarted = True
+        markStartup("First paint")
+        reportStartup()
+        if(startupTiming):
+            QtCore.QTimer.singleShot(0, self.app.quit)
+            return
+        self.themeThread.start()
+        self.welcome.loadBanner()
+        log("[        ] Calling updates thread...")
+        checkForUpdates(self)
+
+    def eventFilter(self, watched: QtCore.QObject, event: QtCore.QEvent) -> bool:
+        if(event.type() == QtCore.QEvent.Paint and not self.backgroundWorkStarted):
+            QtCore.QTimer.singleShot(0, self.startBackgroundWork)
+        return super(Window, self).eventFilter(watched, event)
 
     def loadStyleSheet(self) -> None:
         if not(settings["plainAppearance"]):
+            import qtmodern.styles
             if(settings["mode"] == "dark"):
                 isLight = False
             elif(settings["mode"] == "light"):
@@ -93,7 +98,9 @@ class Window(QtWidgets.QMainWindow):
                 
     
     def isLight(self) -> bool:
-        mode = darkdetect.isLight()
+        mode = self.themeThread.lastModeWasLight
+        if(mode == None):
+            mode = darkdetect.isLight()
         if(mode!=None):
             return mode
         else:
@@ -119,9 +126,11 @@ class Window(QtWidgets.QMainWindow):
         self.tabWidget.setTabsClosable(False)
         self.setCentralWidget(self.tabWidget)
         
-        self.addTab(Welcome(self), QtGui.QIcon(getPath("zip.ico")), "Home Page", closable=False)
+        self.welcome = Welcome(self)
+        self.addTab(self.welcome, QtGui.QIcon(getPath("zip.ico")), "Home Page", closable=False)
 
     def addCompressTab(self) -> None:
+        from Compressor import Compressor
         t = self.addTab(Compressor(self), QtGui.QIcon(getPath("compressFiles.ico")), "Compress Files")
         self.tabWidget.setCurrentIndex(t)
 
@@ -129,6 +138,7 @@ class Window(QtWidgets.QMainWindow):
         tabName = "Extract Files"
         if(zipFile != ""):
             tabName = zipFile.replace("\\", "/").split("/")[-1]
+        from Extractor import Extractor
         t = self.addTab(Extractor(self, zipFile), QtGui.QIcon(getPath("extractFiles.ico")), tabName)
         self.tabWidget.setCurrentIndex(t)
 
@@ -305,8 +315,12 @@ class Window(QtWidgets.QMainWindow):
         self.resized.emit()
         return super(Window, self).resizeEvent(event)
 
+    def changeEvent(self, event: QtCore.QEvent) -> None:
+        if(event.type() == QtCore.QEvent.ThemeChange):
+            self.themeThread.checkNow()
+        return super(Window, self).changeEvent(event)
+
     def closeEvent(self, event: QtCore.QEvent) -> None:
-        self.themeThread.terminate()
         if(self.isCompressing):
             log("[  WARN  ] Compresion running!")
             if(QtWidgets.QMessageBox.question(self, "Warning", "A compression is running! Do you want to quit anyway?", QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No) == QtWidgets.QMessageBox.Yes):
@@ -325,6 +339,8 @@ class Window(QtWidgets.QMainWindow):
                 event.ignore()
         else:
             event.accept()
+        if(event.isAccepted()):
+            self.themeThread.stop()
 
     def createNewWindow(self) -> None:
         Window(self.app)
@@ -2,8 +2,10 @@ debugging = False
 version = 4.1
 
 
-import time, tempfile, os, json, sys, darkdetect, webbrowser
-from threading import Thread
+import time, tempfile, os, json, sys, darkdetect, webbrowser, queue, atexit, subprocess, shutil, Engine
+from threading import Thread, Event
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from sys import platform as _platform
 from PySide2 import QtWidgets, QtCore, QtGui
 from ast import literal_eval
@@ -13,15 +15,23 @@ if(len(sys.argv)>1):
     if('debug' in zip):
         debugging=True
 
+startupTiming = "--startup-timing" in sys.argv
+
 realpath = ""
-dataToLog = []
 app = None
 tempDir = tempfile.TemporaryDirectory()
 
 defaultSettings = {
     "default_algorithm": "Deflated",
     "default_level": 5,
+    "compression_threads": 0,
+    "parallel_deflate_threshold": 64,
     "create_subdir": True,
+    "extraction_threads": 0,
+    "io_block_size": 1024,
+    "io_use_mmap": False,
+    "listing_cache_size": 256,
+    "compression_cache_size": 0,
     "mode": "auto",
     "plainAppearance": _platform=="darwin"
 }
@@ -59,33 +69,102 @@ def setMainApp(newApp: QtWidgets.QApplication):
     app = newApp
 
 
-def log(s: str, force: bool = False) -> None:
-    global debugging
-    timePrefix = time.strftime('[%H:%M:%S] ', time.gmtime(time.time()))
-    dataToLog.append(timePrefix+str(s))
+logLevelDebug = 0
+logLevelInfo = 1
+logLevelWarning = 2
+logLevelError = 3
+
+logLevel = logLevelDebug if debugging else logLevelInfo
+logQueue = queue.SimpleQueue()
+logHistory = deque(maxlen=5000) # Last lines, kept in memory for crash reports
+logBatchSize = 512
+logFileBuffer = 64*1024
+
+
+def getLogLevel(s: str) -> int:
+    if("FAILED" in s):
+        return logLevelError
+    elif("WARN" in s):
+        return logLevelWarning
+    else:
+        return logLevelInfo
+
+
+def log(s: str, force: bool = False, level: int = None) -> None:
+    s = str(s)
+    if(level == None):
+        level = getLogLevel(s)
+    if(level < logLevel and not force):
+        return
+    line = time.strftime('[%H:%M:%S] ', time.gmtime(time.time()))+s
+    logHistory.append(line)
+    logQueue.put(line)
+
+
+def flushLog(timeout: float = 1) -> None:
+    # The writer thread sets the event once every line queued before it is on disk
+    flushed = Event()
+    logQueue.put(flushed)
+    flushed.wait(timeout)
+
+
+def getLogHistory() -> str:
+    return "\n".join(list(logHistory))
+
+
+startupPhases = []
+
+def markStartup(phase: str, when: float = None) -> None:
+    startupPhases.append((phase, time.perf_counter() if when == None else when))
+
+
+def reportStartup() -> None:
+    if(len(startupPhases) < 2):
+        return
+    lastTime = startupPhases[0][1]
+    for phase, when in startupPhases[1:]:
+        line = f"[  INFO  ] Startup: {phase} in {(when-lastTime)*1000:.0f} ms ({(when-startupPhases[0][1])*1000:.0f} ms total)"
+        log(line)
+        if(startupTiming):
+            print(line)
+        lastTime = when
+    startupPhases.clear()
 
 log(f"[   OK   ] REALPATH set to \"{realpath}\"")
+Engine.setLogger(log)
 
 def logToFileWorker() -> None:
     print(f"[##:##:##] [   OK   ] File thread started on temp folder {tempDir.name}")
+    logFile = open(tempDir.name.replace('\\', '/')+'/log.txt', "a+", errors="ignore", buffering=logFileBuffer)
+    atexit.register(flushLog)
     while True:
-        if len(dataToLog)>0:
-            try:
-                with open(tempDir.name.replace('\\', '/')+'/log.txt', "a+", errors="ignore") as log:
-                    try:
-                        if(debugging or "WARN" in str(dataToLog[0]) or "FAILED" in str(dataToLog[0])):
-                            print(dataToLog[0])
-                        log.write(dataToLog[0]+"\n")
-                    except Exception as e:
-                        log.write(f"!--- An error occurred while saving line, missing log line ---!   ({e})\n")
-                del dataToLog[0]
-            except NotADirectoryError:
-                pass
-        else:
-            time.sleep(0.01)
+        # Blocks until there is something to write, then drains whatever else is already queued
+        batch = [logQueue.get()]
+        try:
+            while(len(batch) < logBatchSize):
+                batch.append(logQueue.get_nowait())
+        except queue.Empty:
+            pass
+        lines = []
+        flushed = []
+        for item in batch:
+            if(type(item) == str):
+                if(debugging or "WARN" in item or "FAILED" in item):
+                    print(item)
+                lines.append(item+"\n")
+            else:
+                flushed.append(item)
+        try:
+            logFile.write("".join(lines))
+            logFile.flush()
+        except Exception as e:
+            print(f"[##:##:##] [ FAILED ] Unable to write {len(lines)} log lines ({e})")
+        for event in flushed:
+            event.set()
 
 def openLog() -> None:
     log("[        ] Opening log...")
+    flushLog()
     openOnExplorer(tempDir.name.replace('\\', '/')+'/log.txt', force=True)
 
 def openOnExplorer(file: str, force: bool = True) -> None:
@@ -114,24 +193,95 @@ def openOnExplorer(file: str, force: bool = True) -> None:
 class CheckModeThread(QtCore.QThread):
     refreshTheme = QtCore.Signal()
     shouldBeRunning = True
+    minInterval = 2
+    maxInterval = 60
 
+    # Waits for change notifications from the desktop when it can subscribe to them, and otherwise
+    # polls darkdetect, doubling the interval (up to maxInterval) every time the theme did not change
     def __init__(self):
         super().__init__()
         self.setTerminationEnabled(True)
+        self.wakeUp = Event()
+        self.lastModeWasLight = None
+        self.listener = None
+        self.monitor = None
+        self.checks = 0
+
+    def checkNow(self) -> None:
+        self.wakeUp.set()
+
+    def stop(self) -> None:
+        self.shouldBeRunning = False
+        self.wakeUp.set()
+        if(self.monitor != None):
+            try:
+                self.monitor.terminate()
+            except OSError:
+                pass
+        self.wait(1000)
+
+    def checkTheme(self) -> bool:
+        self.checks += 1
+        isLight = darkdetect.isLight() != False
+        changed = self.lastModeWasLight != None and isLight != self.lastModeWasLight
+        self.lastModeWasLight = isLight
+        if(changed):
+            log("[   OK   ] Theme changed, emitting signal...")
+            self.refreshTheme.emit()
+        return changed
+
+    def listen(self) -> None:
+        try:
+            if(_platform == "linux" and shutil.which("gsettings") != None):
+                # darkdetect's listener leaves gsettings running and only watches gtk-theme
+                self.monitor = subprocess.Popen(("gsettings", "monitor", "org.gnome.desktop.interface"), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+                for line in self.monitor.stdout:
+                    if("color-scheme" in line or "gtk-theme" in line):
+                        self.wakeUp.set()
+                if(self.monitor.wait() != 0 and self.shouldBeRunning):
+                    log(f"[  WARN  ] gsettings monitor exited with code {self.monitor.returncode}, polling the theme instead")
+            else:
+                darkdetect.listener(lambda theme: self.wakeUp.set())
+        except Exception as e:
+            log(f"[  WARN  ] Unable to subscribe to theme changes, polling instead ({e})")
+        self.wakeUp.set()
 
     def run(self) -> None:
         log("[  INFO  ] New theme check thread spawned")
-        lastModeWasLight = darkdetect.isLight()
+        self.checkTheme()
+        if(hasattr(darkdetect, "listener") or _platform == "linux"):
+            self.listener = Thread(target=self.listen, daemon=True)
+            self.listener.start()
+        interval = self.minInterval
         while self.shouldBeRunning:
-            if(lastModeWasLight!=darkdetect.isLight()):
-                log("[   OK   ] Theme changed, emitting signal...")
-                self.refreshTheme.emit()
-                lastModeWasLight = darkdetect.isLight()
-            time.sleep(0.01)
-
-def saveSettings(silent=True, default_algorithm="Deflated", default_level=5, create_subdir=True, mode="auto", plainAppearance=None) -> bool:
+            listening = self.listener != None and self.listener.is_alive()
+            self.wakeUp.wait(self.maxInterval if listening else interval)
+            self.wakeUp.clear()
+            if not(self.shouldBeRunning):
+                break
+            if(self.checkTheme()):
+                interval = self.minInterval
+            else:
+                interval = min(interval*2, self.maxInterval)
+        log(f"[  INFO  ] Theme check thread stopped after {self.checks} checks")
+
+def saveSettings(silent=True, default_algorithm="Deflated", default_level=5, create_subdir=True, mode="auto", plainAppearance=None, compression_threads=None, parallel_deflate_threshold=None, extraction_threads=None, io_block_size=None, io_use_mmap=None, listing_cache_size=None, compression_cache_size=None) -> bool:
     if plainAppearance == None:
         plainAppearance = settings["plainAppearance"]
+    if compression_threads == None:
+        compression_threads = settings["compression_threads"]
+    if parallel_deflate_threshold == None:
+        parallel_deflate_threshold = settings["parallel_deflate_threshold"]
+    if extraction_threads == None:
+        extraction_threads = settings["extraction_threads"]
+    if io_block_size == None:
+        io_block_size = settings["io_block_size"]
+    if io_use_mmap == None:
+        io_use_mmap = settings["io_use_mmap"]
+    if listing_cache_size == None:
+        listing_cache_size = settings["listing_cache_size"]
+    if compression_cache_size == None:
+        compression_cache_size = settings["compression_cache_size"]
     
     global defaultSettings
     try:
@@ -153,7 +303,14 @@ def saveSettings(silent=True, default_algorithm="Deflated", default_level=5, cre
             settingsFile.write(str({
                 "default_algorithm": default_algorithm,
                 "default_level":default_level,
+                "compression_threads":compression_threads,
+                "parallel_deflate_threshold":parallel_deflate_threshold,
                 "create_subdir":create_subdir,
+                "extraction_threads":extraction_threads,
+                "io_block_size":io_block_size,
+                "io_use_mmap":io_use_mmap,
+                "listing_cache_size":listing_cache_size,
+                "compression_cache_size":compression_cache_size,
                 "mode":mode,
                 "plainAppearance": plainAppearance,
                 }))
@@ -210,10 +367,14 @@ try:
 except Exception as e:
     log("[ FAILED ] Unable to read settings! ({0})".format(str(e)))
 
+Engine.configureIO(blockSize=settings["io_block_size"]*1024, useMmap=settings["io_use_mmap"])
+listingCache = Engine.ListingCache(os.path.join(os.path.expanduser("~"), ".SomePythonThings", "Zip Manager", "Listing cache"), settings["listing_cache_size"]*1000000)
+blobCache = Engine.BlobCache(os.path.join(os.path.expanduser("~"), ".SomePythonThings", "Zip Manager", "Compression cache"), settings["compression_cache_size"]*1000000)
+
 def openSettingsWindow(parent):
     global settings
     settingsWindow = QtWidgets.QMainWindow(parent)
-    settingsWindow.setFixedSize(400, 300)
+    settingsWindow.setFixedSize(400, 540)
     settingsWindow.setWindowTitle("SomePythonThings Zip Manager Settings")
     settingsWindow.setWindowFlag(QtCore.Qt.WindowMinimizeButtonHint, False)
     settingsWindow.setWindowModality(QtCore.Qt.ApplicationModal)
@@ -287,6 +448,28 @@ def openSettingsWindow(parent):
     levelSelector.setCurrentIndex(settings["default_level"]-1)
     l.addRow("Default compression level: ", levelSelector)
 
+    threadsSelector = QtWidgets.QComboBox()
+    threadsSelector.insertItem(0, f"Automatic ({Engine.getThreadCount()})")
+    for i in range(1, max(Engine.getThreadCount(), settings["compression_threads"])+1):
+        threadsSelector.insertItem(i, str(i))
+    threadsSelector.setCurrentIndex(settings["compression_threads"])
+    l.addRow("Compression threads: ", threadsSelector)
+
+    thresholdSelector = QtWidgets.QSpinBox()
+    thresholdSelector.setRange(0, 1000000)
+    thresholdSelector.setSuffix(" MB")
+    thresholdSelector.setSpecialValueText("Never")
+    thresholdSelector.setValue(settings["parallel_deflate_threshold"])
+    l.addRow("Split deflated files bigger than: ", thresholdSelector)
+
+    compressionCacheSelector = QtWidgets.QSpinBox()
+    compressionCacheSelector.setRange(0, 1000000)
+    compressionCacheSelector.setSingleStep(1024)
+    compressionCacheSelector.setSuffix(" MB")
+    compressionCacheSelector.setSpecialValueText("Disabled")
+    compressionCacheSelector.setValue(settings["compression_cache_size"])
+    l.addRow("Compressed files cache size: ", compressionCacheSelector)
+
     layout.addWidget(compressionSettings)
 
     extractionSettings = QtWidgets.QGroupBox()
@@ -304,11 +487,47 @@ def openSettingsWindow(parent):
     create_subfolder.stateChanged.connect(lambda: changeText(create_subfolder))
     l.addRow("Extract files on new folder: ", create_subfolder)
 
+    extractionThreadsSelector = QtWidgets.QComboBox()
+    extractionThreadsSelector.insertItem(0, f"Automatic ({Engine.getThreadCount()})")
+    for i in range(1, max(Engine.getThreadCount(), settings["extraction_threads"])+1):
+        extractionThreadsSelector.insertItem(i, str(i))
+    extractionThreadsSelector.setCurrentIndex(settings["extraction_threads"])
+    l.addRow("Extraction threads: ", extractionThreadsSelector)
+
+    listingCacheSelector = QtWidgets.QSpinBox()
+    listingCacheSelector.setRange(0, 100000)
+    listingCacheSelector.setSingleStep(64)
+    listingCacheSelector.setSuffix(" MB")
+    listingCacheSelector.setSpecialValueText("Disabled")
+    listingCacheSelector.setValue(settings["listing_cache_size"])
+    l.addRow("Zip contents cache size: ", listingCacheSelector)
+
     layout.addWidget(extractionSettings)
 
+    ioSettings = QtWidgets.QGroupBox()
+    if(_platform=="darwin"):ioSettings.setFixedWidth(345)
+    ioSettings.setTitle("Input/Output Settings")
+    l = QtWidgets.QFormLayout()
+    ioSettings.setLayout(l)
+
+    blockSizeSelector = QtWidgets.QSpinBox()
+    blockSizeSelector.setRange(64, 65536)
+    blockSizeSelector.setSingleStep(256)
+    blockSizeSelector.setSuffix(" KB")
+    blockSizeSelector.setValue(settings["io_block_size"])
+    l.addRow("Read/write block size: ", blockSizeSelector)
+
+    useMmap = QtWidgets.QCheckBox()
+    useMmap.setChecked(settings["io_use_mmap"])
+    changeText(useMmap)
+    useMmap.stateChanged.connect(lambda: changeText(useMmap))
+    l.addRow("Memory-map files when reading: ", useMmap)
+
+    layout.addWidget(ioSettings)
+
     saveButton = QtWidgets.QPushButton()
     saveButton.setText("Save settings and close")
-    saveButton.clicked.connect(lambda: saveAndCloseSettings(modeSelector, plainAppearance, algorithmSelector, settingsWindow, levelSelector, create_subfolder, parent))
+    saveButton.clicked.connect(lambda: saveAndCloseSettings(modeSelector, plainAppearance, algorithmSelector, settingsWindow, levelSelector, threadsSelector, thresholdSelector, compressionCacheSelector, create_subfolder, extractionThreadsSelector, listingCacheSelector, blockSizeSelector, useMmap, parent))
     layout.addWidget(saveButton)
 
     try:
@@ -341,7 +560,7 @@ def openSettingsWindow(parent):
 
     
 
-def saveAndCloseSettings(modeSelector: QtWidgets.QComboBox, plainAppearance: QtWidgets.QCheckBox, algorithmSelector: QtWidgets.QComboBox, settingsWindow, levelSelector: QtWidgets.QComboBox, create_subfolder: QtWidgets.QCheckBox, parent):
+def saveAndCloseSettings(modeSelector: QtWidgets.QComboBox, plainAppearance: QtWidgets.QCheckBox, algorithmSelector: QtWidgets.QComboBox, settingsWindow, levelSelector: QtWidgets.QComboBox, threadsSelector: QtWidgets.QComboBox, thresholdSelector: QtWidgets.QSpinBox, compressionCacheSelector: QtWidgets.QSpinBox, create_subfolder: QtWidgets.QCheckBox, extractionThreadsSelector: QtWidgets.QComboBox, listingCacheSelector: QtWidgets.QSpinBox, blockSizeSelector: QtWidgets.QSpinBox, useMmap: QtWidgets.QCheckBox, parent):
     global settings, forceClose
     if(algorithmSelector.currentIndex() == 0):
         settings['default_algorithm'] = "Deflated"
@@ -353,6 +572,9 @@ def saveAndCloseSettings(modeSelector: QtWidgets.QComboBox, plainAppearance: QtW
         settings['default_algorithm'] = "Without Compression"
 
     settings["create_subdir"] = create_subfolder.isChecked()
+    settings["extraction_threads"] = extractionThreadsSelector.currentIndex()
+    settings["listing_cache_size"] = listingCacheSelector.value()
+    listingCache.maxSize = settings["listing_cache_size"]*1000000
 
     if(modeSelector.currentIndex() == 0):
         settings['mode'] = 'light'
@@ -366,10 +588,21 @@ def saveAndCloseSettings(modeSelector: QtWidgets.QComboBox, plainAppearance: QtW
     parent.loadStyleSheet()
 
     settings["default_level"] = levelSelector.currentIndex()+1
+    settings["compression_threads"] = threadsSelector.currentIndex()
+    settings["parallel_deflate_threshold"] = thresholdSelector.value()
+    settings["compression_cache_size"] = compressionCacheSelector.value()
+    blobCache.maxSize = settings["compression_cache_size"]*1000000
+    settings["io_block_size"] = blockSizeSelector.value()
+    settings["io_use_mmap"] = useMmap.isChecked()
+    Engine.configureIO(blockSize=settings["io_block_size"]*1024, useMmap=settings["io_use_mmap"])
 
     forceClose = True
     settingsWindow.close()
-    saveSettings(silent=True, create_subdir=settings['create_subdir'], default_level=settings['default_level'], default_algorithm=settings['default_algorithm'], mode=settings['mode'])
+    saveSettings(silent=True, create_subdir=settings['create_subdir'], default_level=settings['default_level'], default_algorithm=settings['default_algorithm'], mode=settings['mode'], compression_threads=settings['compression_threads'], parallel_deflate_threshold=settings['parallel_deflate_threshold'], extraction_threads=settings['extraction_threads'], io_block_size=settings['io_block_size'], io_use_mmap=settings['io_use_mmap'], listing_cache_size=settings['listing_cache_size'], compression_cache_size=settings['compression_cache_size'])
+
+def checkForUpdates(*args, **kwargs) -> None:
+    import Updater # Imports wget, so it is only loaded when updates are checked
+    Updater.checkForUpdates(*args, **kwargs)
 
 def openHelp() -> None:
     webbrowser.open_new("http://www.somepythonthings.tk/programs/somepythonthings-zip-manager/help/")
@@ -389,6 +622,78 @@ def getFileIcon(file) -> QtGui.QIcon:
     if not(QtGui.QIcon.isNull(icon)):
         return icon
 
+class IconService(QtCore.QObject):
+    # Loads file icons once per extension on a small worker pool and hands them to the GUI thread
+    iconLoaded = QtCore.Signal(str, QtGui.QIcon)
+
+    def __init__(self, cacheSize: int = 256, workers: int = 2):
+        super().__init__()
+        self.cacheSize = cacheSize
+        self.cache = OrderedDict()
+        self.waitingItems = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="IconService")
+        self.folderIcon = QtGui.QIcon(QtGui.QPixmap(getPath("folder.ico")).scaledToWidth(24, QtCore.Qt.SmoothTransformation))
+        self.iconLoaded.connect(self.setLoadedIcon)
+
+    def getKey(self, filename: str) -> str:
+        filename = filename.split("/")[-1]
+        if("." in filename):
+            return filename.split(".")[-1].lower()
+        return ""
+
+    def getFolderIcon(self) -> QtGui.QIcon:
+        return self.folderIcon
+
+    def loadIcon(self, key: str, filename: str) -> None:
+        try:
+            icon = getFileIcon(filename)
+        except Exception as e:
+            log(f"[  WARN  ] Unable to load icon for {filename}: {e}")
+            icon = None
+        self.iconLoaded.emit(key, icon if icon else QtGui.QIcon())
+
+    def getIcon(self, filename: str) -> QtGui.QIcon:
+        # Returns None and emits iconLoaded later if the icon isn't cached yet
+        key = self.getKey(filename)
+        if(key in self.cache):
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if not(key in self.waitingItems):
+            self.waitingItems[key] = []
+            self.pool.submit(self.loadIcon, key, filename)
+        return None
+
+    def setIcons(self, items: list, column: int = 0) -> None:
+        # items is a list of (QTreeWidgetItem, filename) tuples. Must be called from the GUI thread
+        for item, filename in items:
+            key = self.getKey(filename)
+            if(key in self.cache):
+                self.cache.move_to_end(key)
+                item.setIcon(column, self.cache[key])
+            elif(key in self.waitingItems):
+                self.waitingItems[key].append((item, column))
+            else:
+                self.waitingItems[key] = [(item, column)]
+                self.pool.submit(self.loadIcon, key, filename)
+
+    def setLoadedIcon(self, key: str, icon: QtGui.QIcon) -> None:
+        self.cache[key] = icon
+        if(len(self.cache) > self.cacheSize):
+            self.cache.popitem(last=False)
+        for item, column in self.waitingItems.pop(key, []):
+            try:
+                item.setIcon(column, icon)
+            except RuntimeError:
+                pass # The item was removed before its icon was ready
+
+iconService = None
+
+def getIconService() -> IconService:
+    global iconService
+    if(iconService == None):
+        iconService = IconService()
+    return iconService
+
 def showWindow(window: QtWidgets.QMainWindow) -> None:
     window.show()
     window.raise_()
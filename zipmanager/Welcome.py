@@ -1,6 +1,5 @@
 from PySide2 import QtWidgets, QtCore, QtGui
 import PySide2
-from Updater import checkForUpdates
 from urllib.request import urlopen
 from threading import Thread
 
@@ -67,6 +66,7 @@ class Welcome(QtWidgets.QWidget):
 
         self.loadPixmapSignal.connect(self.showPic)
 
+    def loadBanner(self) -> None:
         Thread(target=self.loadPicThread, daemon=True).start()
 
     def showPic(self, data) -> None:
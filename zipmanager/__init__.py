@@ -1,15 +1,25 @@
 import os, sys, time
+startupTime = time.perf_counter()
 os.environ["QT_MAC_WANTS_LAYER"] = "1"
 if hasattr(sys, 'frozen'):
-    print(os.path.dirname(sys.executable))
     sys.path.append(os.path.dirname(sys.executable))
+if(len(sys.argv) > 1 and sys.argv[1] in ("compress", "extract", "list", "test", "estimate", "--verbose", "-h", "--help")):
+    # Command line mode: Qt never gets imported
+    import Cli
+    sys.exit(Cli.main(sys.argv[1:]))
+if hasattr(sys, 'frozen'):
+    print(os.path.dirname(sys.executable))
 sys.argv.append("--enable-smooth-scrolling")
 
 from sys import platform as _platform
-import MainWindow, platform, traceback, webbrowser
+import platform, traceback, webbrowser
 from threading import Thread
 print(os.getcwd())
 from Tools import *
+markStartup("Start", startupTime)
+markStartup("Qt and Tools imported")
+import MainWindow
+markStartup("MainWindow imported")
 
 
 from PySide2 import QtWidgets, QtCore, QtGui
@@ -33,8 +43,10 @@ class MainApplication():
 
             self.app = QtWidgets.QApplication(sys.argv)
             setMainApp(self.app)
+            markStartup("QApplication created")
 
             self.app.w = MainWindow.Window(app=self.app)
+            markStartup("Main window created")
 
             
             self.app.trayIcon = QtWidgets.QSystemTrayIcon(self.app)
@@ -79,8 +91,7 @@ class MainApplication():
                 msg.exec_()
             except: pass
             import webbrowser
-            with open(tempDir.name.replace('\\', '/')+'/log.txt', 'r') as f:
-                webbrowser.open("https://www.somepythonthings.tk/error-report/?appName=SomePythonThings Zip Manager&errorBody="+os_info.replace('\n', '{l}').replace(' ', '{s}')+"{l}{l}{l}{l}SomePythonThings Zip Manager Log:{l}"+str(f.read()+"\n\n\n\n"+traceback_info).replace('\n', '{l}').replace(' ', '{s}'))
+            webbrowser.open("https://www.somepythonthings.tk/error-report/?appName=SomePythonThings Zip Manager&errorBody="+os_info.replace('\n', '{l}').replace(' ', '{s}')+"{l}{l}{l}{l}SomePythonThings Zip Manager Log:{l}"+str(getLogHistory()+"\n\n\n\n"+traceback_info).replace('\n', '{l}').replace(' ', '{s}'))
             
             if(debugging):
                 raise e